@@ -0,0 +1,105 @@
+// browser side of the attractions page
+// the catalog (every attraction with its rating, pictures and neighbours) is fetched once
+// per browser session into a session store, then "Find My Adventure" picks from a shuffle
+// queue and draws the card here: clicks don't reach the server
+window.dash_clientside = window.dash_clientside || {};
+window.dash_clientside.attractions = {
+    load: function (modified, catalog) {
+        if (catalog) {
+            return window.dash_clientside.no_update;
+        }
+        return fetch("/data/attractions.json").then(function (r) {
+            if (!r.ok) {
+                throw new Error("attraction catalog: " + r.status);
+            }
+            return r.json();
+        });
+    },
+
+    pick: function (nClicks, catalog, queue) {
+        var noUpdate = window.dash_clientside.no_update;
+
+        function el(type, props, children) {
+            props = props || {};
+            if (children !== undefined) {
+                props.children = children;
+            }
+            return {type: type, namespace: "dash_html_components", props: props};
+        }
+
+        if (!nClicks) {
+            return [el("Div", {className: "attraction-result-container"}, [
+                el("Div", {className: "attractions-placeholder"}, [
+                    el("I", {className: "fas fa-map-marker-alt attractions-placeholder-icon"}),
+                    el("H3", {className: "attractions-placeholder-title"}, "Ready to Explore?"),
+                    el("P", {className: "attractions-placeholder-text"}, "Click the button above to discover your next adventure in Williamsburg!")
+                ])
+            ]), noUpdate];
+        }
+        if (!catalog || !catalog.length) {
+            return [noUpdate, noUpdate]; // still loading, the card is drawn when the catalog arrives
+        }
+
+        // every attraction once before any comes again, a new round doesn't start with the last one
+        var size = catalog.length;
+        var order = queue && queue.size === size ? queue.order.slice() : [];
+        var last = queue ? queue.last : null;
+        if (!order.length) {
+            for (var i = 0; i < size; i++) {
+                order.push(i);
+            }
+            for (var j = size - 1; j > 0; j--) { // Fisher-Yates
+                var k = Math.floor(Math.random() * (j + 1));
+                var swap = order[j];
+                order[j] = order[k];
+                order[k] = swap;
+            }
+            if (size > 1 && order[0] === last) {
+                order[0] = order[size - 1];
+                order[size - 1] = last;
+            }
+        }
+        var position = order.shift();
+        var entry = catalog[position];
+
+        var image = entry.image === null
+            ? el("Div", {className: "attraction-image-fallback"}, [
+                el("I", {className: "fas fa-image attraction-fallback-icon"}),
+                el("Span", {className: "attraction-fallback-text"}, "Image not available")
+            ])
+            : el("Img", {
+                src: entry.image.src,
+                srcSet: entry.image.srcSet,
+                sizes: "(max-width: 768px) 100vw, 900px",
+                className: "attraction-image"
+            });
+
+        var card = el("Div", {className: "attraction-result"}, [
+            el("Div", {className: "attraction-card"}, [
+                el("Div", {className: "attraction-image-container"}, [image]),
+                el("Div", {className: "attraction-content"}, [
+                    el("Div", {className: "attraction-header"}, [
+                        el("H2", {className: "attraction-name"}, entry.name),
+                        el("Div", {className: "attraction-rating-container"}, [
+                            el("Span", {id: "attraction-stars", className: "attraction-rating"}), // filled in by attraction_stars
+                            el("Span", {id: "attraction-rating-number", className: "attraction-rating-number"}, entry.rating + "/100")
+                        ])
+                    ]),
+                    el("Div", {className: "attraction-location-container"}, [
+                        el("I", {className: "fas fa-map-marker-alt attraction-icon"}),
+                        el("Span", {className: "attraction-location"}, "Williamsburg, VA")
+                    ]),
+                    el("Div", {className: "attraction-recommendation-container"}, [
+                        el("I", {className: "fas fa-star attraction-icon"}),
+                        el("Span", {className: "attraction-recommendation"}, "Highly Recommended")
+                    ]),
+                    entry.nearby ? el("Div", {className: "attraction-location-container"}, [
+                        el("I", {className: "fas fa-walking attraction-icon"}),
+                        el("Span", {className: "attraction-location"}, "Also nearby: " + entry.nearby)
+                    ]) : null
+                ])
+            ])
+        ]);
+        return [card, {size: size, order: order, last: position}];
+    }
+};
@@ -0,0 +1,60 @@
+// browser side of the restaurants page
+// the server sends one page of results as columns (name: [...], phone: [...], ...)
+// and the cards are built here, so callback answers stay small
+window.dash_clientside = window.dash_clientside || {};
+window.dash_clientside.restaurants = {
+    render: function (page) {
+        function el(type, props, children) {
+            props = props || {};
+            if (children !== undefined) {
+                props.children = children;
+            }
+            return {type: type, namespace: "dash_html_components", props: props};
+        }
+
+        if (!page || !page.total) {
+            return [el("Div", {}, "No restaurants found."), "", true, true];
+        }
+
+        var columns = page.columns;
+        var cards = [];
+        for (var i = 0; i < columns.name.length; i++) {
+            var rating = columns.rating[i];
+            var full = Math.floor(rating);
+            var stars = "★".repeat(full) + "☆".repeat(5 - full);
+            cards.push(el("Div", {className: "restaurant-card", key: page.offset + i}, [
+                el("Div", {className: "restaurant-card-content"}, [
+                    el("Div", {className: "restaurant-header"}, [
+                        el("H4", {className: "restaurant-name"}, columns.name[i]),
+                        el("Div", {className: "restaurant-rating-container"}, [
+                            el("Span", {className: "restaurant-rating"}, stars),
+                            el("Span", {className: "rating-number"}, rating + "/5"),
+                            el("Span", {className: "review-count"}, "(" + columns.reviews[i] + " reviews)")
+                        ])
+                    ]),
+                    el("Div", {className: "restaurant-info"}, [
+                        el("Div", {className: "restaurant-info-item"}, [
+                            el("Span", {className: "phone-emoji"}, "📞"),
+                            el("Span", {className: "restaurant-phone"}, columns.phone[i])
+                        ]),
+                        columns.distance[i] === null ? null : el("Div", {className: "restaurant-info-item"}, [
+                            el("Span", {className: "phone-emoji"}, "📍"),
+                            el("Span", {className: "restaurant-phone"}, columns.distance[i] + " mi away")
+                        ]),
+                        el("Div", {className: "restaurant-info-item"}, [
+                            el("A", {href: columns.website[i], target: "_blank", className: "website-button"}, [
+                                el("I", {className: "fas fa-external-link-alt button-icon"}),
+                                el("Span", {className: "button-text"}, "Visit Website")
+                            ])
+                        ])
+                    ])
+                ])
+            ]));
+        }
+
+        var first = page.offset + 1;
+        var last = page.offset + columns.name.length;
+        var shown = "Showing " + first + "-" + last + " of " + page.total;
+        return [cards, shown, page.prev === null, page.next === null];
+    }
+};
@@ -0,0 +1,201 @@
+# dash background callbacks for the callbacks that may have to wait on another website
+# with BACKGROUND_CALLBACKS=1 and diskcache installed (pip install "dash[diskcache]") they
+# run as jobs in their own process, the browser polls for the answer and the web server's
+# threads stay free for everything else. at most MAX_UPSTREAM_JOBS of them run at the same
+# time (slots kept in the same disk cache, so the limit holds across worker processes too).
+# off by default: the callbacks only read the in-memory snapshots (refresher.py), and a
+# job forks the whole web server for every request, which is about ten times slower
+import functools
+import os
+import time
+from contextlib import contextmanager
+
+from dash import DiskcacheManager, callback
+
+from forkguard import guard, sqlite_call
+
+JOBS_DIR = os.environ.get(
+    "BACKGROUND_JOBS_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "jobs"),
+)
+MAX_UPSTREAM_JOBS = int(os.environ.get("MAX_UPSTREAM_JOBS", 4))  # background jobs running at once
+POLL_INTERVAL = 500  # milliseconds between the browser's "is it done yet" requests
+SLOT_EXPIRE = 120  # seconds after which a slot is free again, even if its job was killed
+SLOT_WAIT = 0.05  # seconds between two looks for a free slot
+RESULT_TTL = 60  # seconds a finished job's answer is kept for identical requests
+
+
+# MAX_UPSTREAM_JOBS keys in the disk cache, a running job holds one of them
+# (a slot is taken with cache.add, which only succeeds if nobody holds the key)
+# the web server takes the slot before it forks the job and the job gives it back, so
+# no process is started while all slots are taken
+class JobSlots:
+    def __init__(self, cache, size, expire=SLOT_EXPIRE):
+        self.cache = cache
+        self.keys = [f"upstream-job-{i}" for i in range(size)]
+        self.expire = expire
+
+    # waits for a free slot and returns its key, held by this process until owner() is called
+    def acquire(self):
+        while True:
+            key = next((k for k in self.keys if self.cache.add(k, os.getpid(), expire=self.expire, retry=True)), None)
+            if key is not None:
+                return key
+            self.free_dead()
+            time.sleep(SLOT_WAIT)
+
+    # the job's process holds the slot from now on (freed by free_dead if it is killed)
+    def owner(self, key, pid):
+        self.cache.set(key, pid, expire=self.expire, retry=True)
+
+    def release(self, key):
+        self.cache.delete(key, retry=True)
+
+    # a job killed by dash (its answer was already there from an identical request) never
+    # gives its slot back itself, free the slots whose process is gone
+    def free_dead(self):
+        import psutil
+        for key in self.keys:
+            pid = self.cache.get(key, retry=True)
+            try:
+                alive = pid is not None and psutil.Process(pid).status() != psutil.STATUS_ZOMBIE
+            except psutil.NoSuchProcess:
+                alive = False
+            if pid is not None and not alive:
+                self.cache.delete(key, retry=True)
+
+
+# dash starts every job with a fork of the web server process, which only happens once a
+# slot is free (JobSlots) and while no thread is inside sqlite (forkguard.py).
+# it checks whether a job is still alive with psutil.pid_exists and then psutil.Process,
+# a job that ends in between raised NoSuchProcess and turned the poll into an error
+class JobManager(DiskcacheManager):
+    def __init__(self, cache, slots, **kwargs):
+        super().__init__(cache, **kwargs)
+        self.slots = slots
+
+    def call_job_fn(self, key, job_fn, args, context):
+        slot = self.slots.acquire() # waits here while MAX_UPSTREAM_JOBS jobs are running
+
+        def job_in_slot(*job_args):
+            try:
+                return job_fn(*job_args)
+            finally:
+                self.slots.release(slot)
+
+        try:
+            with guard.exclusive():
+                pid = super().call_job_fn(key, job_in_slot, args, context)
+        except BaseException:
+            self.slots.release(slot) # nothing was started
+            raise
+        self.slots.owner(slot, pid)
+        return pid
+
+    def job_running(self, job):
+        import psutil
+        try:
+            return super().job_running(job)
+        except psutil.NoSuchProcess:
+            return False
+
+    def terminate_job(self, job):
+        import psutil
+        try:
+            super().terminate_job(job)
+        except psutil.NoSuchProcess:
+            pass
+
+
+# two browsers asking the same thing get the same job key, without cache_by the first
+# one to collect the answer deletes it and the other polls forever. with cache_by the
+# answer stays for RESULT_TTL seconds and is shared (the time bucket keeps it fresh)
+def result_bucket():
+    return int(time.time() // RESULT_TTL)
+
+
+# the disk cache is a sqlite database as well, the calls dash makes to it from the
+# request threads are guarded like the other sqlite calls. diskcache keeps a connection
+# per thread and opens a new one in a forked process by itself; close() ends this
+# thread's connection and is called after every request (init_app), so a thread that
+# ends never closes one while a job is being forked
+def guarded_cache(diskcache, directory):
+    class GuardedCache(diskcache.Cache):
+        @sqlite_call
+        def close(self):
+            return super().close()
+
+        @sqlite_call
+        def get(self, *args, **kwargs):
+            return super().get(*args, **kwargs)
+
+        @sqlite_call
+        def set(self, *args, **kwargs):
+            return super().set(*args, **kwargs)
+
+        @sqlite_call
+        def add(self, *args, **kwargs):
+            return super().add(*args, **kwargs)
+
+        @sqlite_call
+        def delete(self, *args, **kwargs):
+            return super().delete(*args, **kwargs)
+
+        @sqlite_call
+        def touch(self, *args, **kwargs):
+            return super().touch(*args, **kwargs)
+
+        @contextmanager
+        def transact(self, retry=False):
+            with guard.shared(), super().transact(retry):
+                yield
+
+    return GuardedCache(directory)
+
+
+def make_manager():
+    if os.environ.get("BACKGROUND_CALLBACKS", "0") != "1":
+        return None
+    try:
+        import diskcache
+        cache = guarded_cache(diskcache, JOBS_DIR)
+        slots = JobSlots(cache, MAX_UPSTREAM_JOBS)
+        return JobManager(cache, slots, cache_by=[result_bucket], expire=RESULT_TTL)
+    except ImportError:  # diskcache (or multiprocess/psutil) is optional
+        return None
+
+
+manager = make_manager()
+
+
+def close_connection(exc):
+    manager.handle.close()
+
+
+def init_app(server):
+    if manager is not None:
+        server.teardown_request(close_connection)
+
+
+# like @callback, but as a background job when a manager is available
+# with progress outputs the function gets set_progress as its first argument (a no-op
+# when it runs as an ordinary callback), running is passed on as is
+def background_callback(*dependencies, progress=None, progress_default=None, running=None, **kwargs):
+    def decorator(fn):
+        if manager is None:
+            @functools.wraps(fn)
+            def plain(*args):
+                return fn(lambda *values: None, *args) if progress is not None else fn(*args)
+            return callback(*dependencies, running=running, **kwargs)(plain)
+
+        return callback(
+            *dependencies,
+            background=True,
+            manager=manager,
+            interval=POLL_INTERVAL,
+            progress=progress,
+            progress_default=progress_default,
+            running=running,
+            **kwargs,
+        )(fn)
+    return decorator
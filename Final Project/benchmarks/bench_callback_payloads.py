@@ -0,0 +1,97 @@
+# benchmark: what every server callback costs to send, per json encoder and per encoding
+# - encode: time dash spends turning the callback's answer into json (plotly's encoder,
+#   with the "json" engine and with "orjson" when it is installed)
+# - bytes on the wire: uncompressed, gzip and (if installed) brotli, as compression.py sends them
+# the app runs in this process against the load test's stand-in upstreams, nothing is downloaded
+# run from the "Final Project" folder:  python benchmarks/bench_callback_payloads.py
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import loadtest
+
+NUMBER = 200  # requests per timing
+
+workdir = tempfile.mkdtemp()
+stub = loadtest.start_stub()
+for path, (_, _, _, var) in loadtest.UPSTREAMS.items():
+    os.environ[var] = f"http://127.0.0.1:{stub.server_address[1]}{path}"
+os.environ.update(
+    START_REFRESHER="0",
+    BACKGROUND_CALLBACKS="0",
+    SHARED_CACHE="memory",
+    RATINGS_DB=os.path.join(workdir, "ratings.db"),
+    RESTAURANTS_DB=os.path.join(workdir, "restaurants.db"),
+)
+
+import plotly.io as pio
+import plotly.io.json
+
+import compression
+import finalprojectapp
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ENGINES = ["json"] + (["orjson"] if orjson is not None else [])
+
+# dash encodes every answer with plotly.io.json.to_json_plotly, timed here
+encode_seconds = []
+to_json_plotly = plotly.io.json.to_json_plotly
+
+
+def timed_to_json(*args, **kwargs):
+    started = time.perf_counter()
+    try:
+        return to_json_plotly(*args, **kwargs)
+    finally:
+        encode_seconds.append(time.perf_counter() - started)
+
+
+plotly.io.json.to_json_plotly = timed_to_json
+
+
+# a path instead of a payload is a plain GET (the attraction catalog)
+def post(client, payload, accept_encoding):
+    headers = {"Accept-Encoding": accept_encoding}
+    if isinstance(payload, str):
+        r = client.get(payload, headers=headers)
+    else:
+        r = client.post(loadtest.CALLBACK_PATH, json=payload, headers=headers)
+    assert r.status_code == 200, (r.status_code, r.get_data()[:200])
+    return r
+
+
+def main():
+    client = finalprojectapp.server.test_client()
+    payloads = {page: build(random.Random(1)) for page, build in loadtest.PAGES.items()}
+    for payload in payloads.values():
+        post(client, payload, "identity") # first call downloads from the stand-in
+
+    encodings = ["identity", "gzip"] + (["br"] if compression.brotli is not None else [])
+    header = f"{'callback':<12}" + "".join(f"{e + ' us':>12}" for e in ENGINES)
+    header += "".join(f"{e + ' B':>12}" for e in encodings)
+    print(header)
+    for page, payload in payloads.items():
+        row = f"{page:<12}"
+        for engine in ENGINES:
+            pio.json.config.default_engine = engine
+            encode_seconds.clear()
+            for _ in range(NUMBER):
+                post(client, payload, "identity")
+            row += f"{sum(encode_seconds) / NUMBER * 1e6:12.1f}"
+        for encoding in encodings:
+            row += f"{len(post(client, payload, encoding).get_data()):12d}"
+        print(row)
+    print(f"compression: {'on' if compression.ENABLED else 'off'}, brotli {'installed' if compression.brotli else 'not installed'}")
+    stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# check + timing for request coalescing: N visitors open the weather page at the same
+# moment and the upstream (a slow stand-in for open-meteo) must be asked exactly once
+# run from the "Final Project" folder:  python benchmarks/bench_singleflight.py --users 50
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["START_REFRESHER"] = "0"  # the test starts from a cold cache
+os.environ["SHARED_CACHE"] = "memory"  # not data/cache.db, where an earlier run left the forecast
+
+import httpclient
+from bench_weather import sample_hourly
+
+UPSTREAM_DELAY = 0.3  # seconds the fake open-meteo takes to answer
+
+
+class FakeResponse:
+    status_code = 200
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"hourly": sample_hourly()}
+
+
+def fire(fn, users):
+    barrier = threading.Barrier(users)
+    timings = []
+
+    def visitor():
+        barrier.wait() # everyone starts at the same time
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=visitor) for _ in range(users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent update_weather calls must share one upstream request")
+    parser.add_argument("--users", type=int, default=50)
+    args = parser.parse_args()
+
+    upstream_calls = []
+
+    def fake_get(url, **kwargs):
+        upstream_calls.append(url)
+        time.sleep(UPSTREAM_DELAY)
+        return FakeResponse()
+
+    httpclient.get = fake_get
+
+    import finalprojectapp  # registers the pages
+    weather = sys.modules["pages.finalprojectweather"]
+
+    failed = False
+    checks = [
+        ("update_weather", weather.weather_outputs), # its body, update_weather's arguments depend on BACKGROUND_CALLBACKS
+        ("fetch_hourly_temp (other location)", lambda: weather.fetch_hourly_temp(36.85, -75.98)),
+    ]
+    for name, fn in checks:
+        upstream_calls.clear()
+        timings = sorted(fire(fn, args.users))
+        ok = len(upstream_calls) == 1
+        failed = failed or not ok
+        print(f"{name}: {args.users} concurrent calls -> {len(upstream_calls)} upstream request(s) "
+              f"[{'ok' if ok else 'FAIL'}], slowest {timings[-1] * 1000:.0f} ms, "
+              f"median {timings[len(timings) // 2] * 1000:.0f} ms")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
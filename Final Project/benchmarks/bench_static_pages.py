@@ -0,0 +1,57 @@
+# micro-benchmark: what a page visit asks the server for besides the html (layout, callbacks
+# and the page router's answer), serialized by dash on every visit (before) vs the frozen
+# copies in staticpages.py (after), and a browser revalidating its copy (304)
+# run from the "Final Project" folder:  python benchmarks/bench_static_pages.py
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("START_REFRESHER", "0") # no downloads, only the page shells are measured
+
+import finalprojectapp
+from staticpages import router_request
+
+NUMBER = 300  # visits per timing
+PAGES = ["/", "/weather", "/restaurants", "/attractions"]
+
+
+def visit(client, path, etags=None):
+    etags = etags or {}
+    for route in ("/_dash-layout", "/_dash-dependencies"):
+        headers = {"If-None-Match": etags[route]} if route in etags else {}
+        r = client.get(route, headers=headers)
+        assert r.status_code in (200, 304), r.status_code
+    r = client.post("/_dash-update-component", json=router_request(path))
+    assert r.status_code == 200, r.status_code
+    return r.get_data()
+
+
+def main():
+    static = finalprojectapp.static_pages
+    client = finalprojectapp.server.test_client()
+    static.ensure_frozen() # done by the first request otherwise
+    frozen_views, frozen_pages = dict(static.views), dict(static.pages)
+    etags = {route: f'"{f.etag}"' for route, f in frozen_views.items()}
+
+    def timing(etags=None):
+        return timeit.timeit(lambda: [visit(client, p, etags) for p in PAGES], number=NUMBER) / (NUMBER * len(PAGES))
+
+    static.views, static.pages = {}, {} # dash's own views
+    dynamic = {p: visit(client, p) for p in PAGES}
+    before = timing()
+    static.views, static.pages = frozen_views, frozen_pages
+    assert all(visit(client, p) == dynamic[p] for p in PAGES), "the frozen pages differ from dash's"
+
+    results = [
+        ("before (dash serializes)", before),
+        ("after (frozen)", timing()),
+        ("after, browser has a copy", timing(etags)),
+    ]
+    base = results[0][1]
+    for name, per_visit in results:
+        print(f"{name:<30} {per_visit * 1e6:9.1f} us/visit  {base / per_visit:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# micro-benchmark: old pandas weather aggregation vs the numpy Forecast
+# run from the "Final Project" folder:  python benchmarks/bench_weather.py
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+from forecast import Forecast
+
+NUMBER = 2000  # runs per timing
+
+
+# fake open-meteo "hourly" block: 2 days of hourly temperatures like the real api returns
+def sample_hourly(days=2):
+    rng = np.random.default_rng(0)
+    times = [f"2025-07-{d + 1:02d}T{h:02d}:00" for d in range(days) for h in range(24)]
+    temps = np.round(22 + 6 * np.sin(np.arange(len(times)) / 24 * 2 * np.pi) + rng.normal(0, 1, len(times)), 1)
+    return {"time": times, "temperature_2m": temps.tolist()}
+
+
+# what fetch_hourly_temp + update_weather did before (DataFrame + groupby per callback)
+def pandas_path(hourly):
+    df = pd.DataFrame({"time": hourly["time"], "temp_C": hourly["temperature_2m"]})
+    df["time"] = pd.to_datetime(df["time"])
+    df["temp_F"] = df["temp_C"] * 9/5 + 32
+    now = df.iloc[0]["temp_F"]
+    tmin = df["temp_F"].min()
+    tmax = df["temp_F"].max()
+    summary = (
+        df.assign(Date=df["time"].dt.date)
+        .groupby("Date")["temp_F"]
+        .agg(["min", "max", "mean"])
+        .round(1)
+        .rename(columns={"min": "Min °F", "max": "Max °F", "mean": "Avg °F"})
+        .reset_index()
+    )
+    rows = [(str(r[0]), r[1], r[2], r[3]) for r in summary.values]
+    return now, tmin, tmax, rows
+
+
+# the same numbers from the numpy forecast
+def numpy_path(hourly):
+    fc = Forecast.from_open_meteo(hourly)
+    return fc.now(), fc.min(), fc.max(), fc.summary_rows()
+
+
+# callbacks only read the already built forecast (it is built once per download)
+def numpy_callback_path(fc):
+    return fc.now(), fc.min(), fc.max(), fc.summary_rows()
+
+
+def main():
+    hourly = sample_hourly()
+    assert pandas_path(hourly) == numpy_path(hourly), "numpy path returns different numbers"
+
+    fc = Forecast.from_open_meteo(hourly)
+    results = [
+        ("pandas (build + aggregate)", timeit.timeit(lambda: pandas_path(hourly), number=NUMBER)),
+        ("numpy (build + aggregate)", timeit.timeit(lambda: numpy_path(hourly), number=NUMBER)),
+        ("numpy (callback, prebuilt)", timeit.timeit(lambda: numpy_callback_path(fc), number=NUMBER)),
+    ]
+    base = results[0][1]
+    for name, total in results:
+        print(f"{name:<28} {total / NUMBER * 1e6:9.1f} us/call  {base / total:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# micro-benchmark: building + serializing the weather chart on every callback (before)
+# vs the chart template and the per-forecast json cache in weatherchart.py (after)
+# run from the "Final Project" folder:  python benchmarks/bench_weather_chart.py
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import plotly.graph_objects as go
+from plotly.io.json import to_json_plotly
+
+import weatherchart
+from bench_weather import sample_hourly
+from forecast import Forecast
+
+NUMBER = 200  # runs per timing
+
+
+# what update_weather did before: a new figure, the whole styling, then dash serializes it
+def before(fc):
+    fig = go.Figure(go.Scatter(x=fc.times, y=fc.temp_f, mode="lines+markers"))
+    fig.update_layout(
+        margin=dict(l=20, r=20, t=20, b=20),
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font=dict(family="'Segoe UI', Tahoma, Geneva, Verdana, sans-serif", size=12),
+        yaxis=dict(
+            title=dict(text="Temperature (°F)", font=dict(size=14, color="#495057")),
+            tickfont=dict(size=12, color="#6c757d"),
+            gridcolor='rgba(0,0,0,0.1)',
+            zeroline=False
+        ),
+        xaxis=dict(
+            title=dict(text="Time", font=dict(size=14, color="#495057")),
+            tickfont=dict(size=12, color="#6c757d"),
+            gridcolor='rgba(0,0,0,0.1)',
+            zeroline=False
+        ),
+        hoverlabel=dict(
+            bgcolor="white",
+            font_size=12,
+            font_family="'Segoe UI', Tahoma, Geneva, Verdana, sans-serif"
+        )
+    )
+    fig.update_traces(
+        line=dict(color='#8B4513', width=3),
+        marker=dict(color='#A0522D', size=6, line=dict(color='white', width=2)),
+        hovertemplate='<b>%{x}</b><br>Temperature: %{y:.1f}°F<extra></extra>'
+    )
+    return to_json_plotly(fig)
+
+
+# a forecast drawn for the first time: template figure + serialization
+def after_cold(fc):
+    weatherchart.chart_cache.clear()
+    return weatherchart.figure_json(fc)
+
+
+# every later callback for the same forecast
+def after_warm(fc):
+    return weatherchart.figure_json(fc)
+
+
+def main():
+    fc = Forecast.from_open_meteo(sample_hourly())
+    old = json.loads(before(fc))["data"][0]
+    new = json.loads(after_cold(fc))["data"][0]
+    assert old["x"] == new["x"] and old["y"] == new["y"], "the new chart plots different numbers"
+
+    results = [
+        ("before (build + style + json)", timeit.timeit(lambda: before(fc), number=NUMBER)),
+        ("after, new forecast", timeit.timeit(lambda: after_cold(fc), number=NUMBER)),
+        ("after, cached forecast", timeit.timeit(lambda: after_warm(fc), number=NUMBER)),
+    ]
+    base = results[0][1]
+    for name, total in results:
+        print(f"{name:<30} {total / NUMBER * 1e6:9.1f} us/call  {base / total:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
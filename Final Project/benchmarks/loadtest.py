@@ -0,0 +1,334 @@
+# load test: many simulated visitors using the three pages at once, without touching the
+# real Overpass, Open-Meteo or visitwilliamsburg.com
+#
+# a stand-in server on localhost replays the responses saved in benchmarks/recorded/, the
+# app is started against it (OVERPASS_URL, OPEN_METEO_URL and ATTRACTIONS_URL) and the
+# users post the same /_dash-update-component requests the browser sends. the report has
+# requests/sec and p50/p95/p99 latency per page, and the exit code is 1 when a number is
+# worse than benchmarks/loadtest_thresholds.json allows
+#
+# run from the "Final Project" folder:
+#   python benchmarks/loadtest.py --users 20 --duration 30
+#   python benchmarks/loadtest.py --app-url http://127.0.0.1:8050   # an already running app
+#   python benchmarks/loadtest.py --gunicorn   # the production server (gunicorn.conf.py)
+#   python benchmarks/loadtest.py --background   # upstream callbacks as background jobs (backgroundjobs.py)
+#   python benchmarks/loadtest.py --record   # refresh benchmarks/recorded/ from the real apis once
+import argparse
+import json
+import math
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCH_DIR)
+RECORDED_DIR = os.path.join(BENCH_DIR, "recorded")
+THRESHOLDS = os.path.join(BENCH_DIR, "loadtest_thresholds.json")
+CALLBACK_PATH = "/_dash-update-component"
+
+# stand-in path -> (recorded file, content type, real endpoint used by --record, env var of the app)
+UPSTREAMS = {
+    "/overpass": ("overpass.json", "application/json", "https://overpass-api.de/api/interpreter", "OVERPASS_URL"),
+    "/open-meteo": ("open_meteo.json", "application/json", "https://api.open-meteo.com/v1/forecast", "OPEN_METEO_URL"),
+    "/attractions": ("attractions.html", "text/html; charset=utf-8",
+                     "https://www.visitwilliamsburg.com/things-to-do/museums-and-attractions/", "ATTRACTIONS_URL"),
+}
+
+
+# ---- stand-in upstream server ----
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    delay = 0.0 # seconds added to every answer, like a slow upstream
+    record = False
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        upstream = UPSTREAMS.get(parts.path)
+        if upstream is None:
+            self.send_error(404)
+            return
+        filename, content_type, real_url, _ = upstream
+        path = os.path.join(RECORDED_DIR, filename)
+        if self.record and not os.path.exists(path):
+            # first request for this upstream: ask the real one and keep its answer
+            r = requests.get(real_url + (f"?{parts.query}" if parts.query else ""), timeout=60)
+            r.raise_for_status()
+            with open(path, "wb") as f:
+                f.write(r.content)
+        with open(path, "rb") as f:
+            body = f.read()
+        etag = f'"{len(body):x}-{int(os.path.getmtime(path)):x}"'
+        if self.delay:
+            time.sleep(self.delay)
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass # keep the report readable
+
+
+def start_stub(delay=0.0, record=False):
+    handler = type("Handler", (ReplayHandler,), {"delay": delay, "record": record})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# ---- the app under test ----
+
+def start_app(stub_url, port, workdir, gunicorn=False, background=False):
+    env = dict(os.environ)
+    for path, (_, _, _, var) in UPSTREAMS.items():
+        env[var] = stub_url + path
+    # fresh stores, so restaurants come from the stand-in and not from an imported extract
+    env["RATINGS_DB"] = os.path.join(workdir, "ratings.db")
+    env["RESTAURANTS_DB"] = os.path.join(workdir, "restaurants.db")
+    env["SHARED_CACHE_DB"] = os.path.join(workdir, "cache.db")
+    # the default that ships (ordinary callbacks) unless --background asks for jobs
+    # the thresholds are for ordinary callbacks, a background job costs a process per request
+    if background:
+        env["BACKGROUND_CALLBACKS"] = "1"
+    else:
+        env.pop("BACKGROUND_CALLBACKS", None)
+    env["BACKGROUND_JOBS_DIR"] = os.path.join(workdir, "jobs")
+    if gunicorn:
+        command = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--bind", f"127.0.0.1:{port}"]
+    else:
+        code = f"import finalprojectapp; finalprojectapp.app.run(host='127.0.0.1', port={port}, debug=False)"
+        command = [sys.executable, "-c", code]
+    log = open(os.path.join(workdir, "app.log"), "wb") # the request log would fill a pipe
+    # own process group, so background callback jobs are stopped with the app
+    return subprocess.Popen(command, cwd=APP_DIR, env=env, stdout=log, stderr=log, start_new_session=True)
+
+
+# waits until the app says it is ready (every background dataset was downloaded once)
+def wait_until_warm(app_url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            r = requests.get(app_url + "/health/ready", timeout=2)
+            if r.status_code == 200:
+                return r.json()
+        except requests.RequestException:
+            pass
+        time.sleep(0.25)
+    raise SystemExit(f"the app at {app_url} did not warm up within {timeout}s")
+
+
+# ---- what the browser sends for each page ----
+
+def dash_request(outputs, inputs):
+    return {
+        "output": outputs[0] if len(outputs) == 1 else "..{}..".format("...".join(outputs)),
+        "outputs": [{"id": o.split(".")[0], "property": o.split(".")[1]} for o in outputs]
+        if len(outputs) > 1 else {"id": outputs[0].split(".")[0], "property": outputs[0].split(".")[1]},
+        "inputs": [{"id": i, "property": p, "value": v} for i, p, v in inputs],
+        "changedPropIds": [f"{inputs[0][0]}.{inputs[0][1]}"],
+    }
+
+
+def weather_request(rng):
+    outputs = ["temp-chart-json.data", "kpi-now.children", "kpi-min.children", "kpi-max.children",
+               "weather-summary.data"]
+    return dash_request(outputs, [("refresh-btn", "n_clicks", rng.randint(0, 5))])
+
+
+CUISINES = ["American", "Asian", "BBQ/Barbeque", "Indian", "Italian/Pizza", "Seafood", "Other"]
+
+
+def restaurants_request(rng):
+    return dash_request(["restaurant-page.data"], [
+        ("search-btn", "n_clicks", rng.randint(0, 5)),
+        ("cuisine-dd", "value", rng.choice(CUISINES)),
+        ("sort-dd", "value", rng.choice(["default", "rating", "distance"])),
+        ("near-dd", "value", "Historic Area"),
+        ("radius-dd", "value", rng.choice([0, 1, 2, 5])),
+        ("restaurant-cursor", "data", None),
+    ])
+
+
+# a new session fetching the attraction catalog, the clicks after it stay in the browser
+def attractions_request(rng):
+    return "/data/attractions.json"
+
+
+PAGES = {"weather": weather_request, "restaurants": restaurants_request, "attractions": attractions_request}
+
+
+# ---- simulated users ----
+
+# one callback like the browser does it: background callbacks answer with a job id first,
+# then the browser asks again until the job is done (backgroundjobs.py)
+# (a path instead of a payload is a plain GET)
+def call(session, app_url, payload, poll=0.05, timeout=30):
+    if isinstance(payload, str):
+        return session.get(app_url + payload, timeout=timeout).status_code == 200
+    deadline = time.monotonic() + timeout
+    r = session.post(app_url + CALLBACK_PATH, json=payload, timeout=timeout)
+    job = None
+    while time.monotonic() < deadline:
+        if r.status_code == 204: # no_update
+            return True
+        if r.status_code != 200:
+            return False
+        try:
+            body = r.json()
+        except ValueError:
+            return False
+        if "job" in body:
+            job = {"cacheKey": body["cacheKey"], "job": body["job"]}
+        elif job is None or "response" in body:
+            return True # an ordinary callback, or the job is done
+        time.sleep(poll) # the job is still running
+        r = session.post(app_url + CALLBACK_PATH, params=job, json=payload, timeout=timeout)
+    return False
+
+
+def user(app_url, stop_at, seed, results, lock):
+    rng = random.Random(seed)
+    session = requests.Session()
+    mine = []
+    while time.monotonic() < stop_at:
+        page = rng.choice(list(PAGES))
+        payload = PAGES[page](rng)
+        started = time.perf_counter()
+        try:
+            ok = call(session, app_url, payload)
+        except requests.RequestException:
+            ok = False
+        mine.append((page, time.perf_counter() - started, ok))
+    with lock:
+        results.extend(mine)
+
+
+# nearest-rank percentile of sorted latencies, in milliseconds
+def percentile_ms(sorted_values, q):
+    if not sorted_values:
+        return None
+    k = max(0, math.ceil(q / 100 * len(sorted_values)) - 1)
+    return sorted_values[k] * 1000
+
+
+def report(results, seconds):
+    pages = {}
+    for page in PAGES:
+        latencies = sorted(t for p, t, ok in results if p == page and ok)
+        errors = sum(1 for p, _, ok in results if p == page and not ok)
+        pages[page] = {
+            "requests": len(latencies) + errors,
+            "errors": errors,
+            "rps": len(latencies) / seconds,
+            "p50_ms": percentile_ms(latencies, 50),
+            "p95_ms": percentile_ms(latencies, 95),
+            "p99_ms": percentile_ms(latencies, 99),
+        }
+    return pages
+
+
+# names of the numbers that are worse than the thresholds allow
+def regressions(pages, thresholds):
+    failed = []
+    for page, limits in thresholds.items():
+        numbers = pages.get(page, {})
+        for name, limit in limits.items():
+            if name.startswith("min_"):
+                value = numbers.get(name[4:])
+                if value is None or value < limit:
+                    failed.append(f"{page} {name[4:]} {value} < {limit}")
+            elif name.startswith("max_"):
+                value = numbers.get(name[4:])
+                if value is None or value > limit:
+                    failed.append(f"{page} {name[4:]} {value} > {limit}")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the app against recorded upstream responses")
+    parser.add_argument("--users", type=int, default=10, help="simulated users sending requests at once")
+    parser.add_argument("--duration", type=float, default=20, help="seconds to keep sending requests")
+    parser.add_argument("--warmup", type=float, default=2, help="seconds of requests that are not counted")
+    parser.add_argument("--upstream-delay", type=float, default=0.0, help="seconds the stand-in takes to answer")
+    parser.add_argument("--app-url", help="test an app that is already running (pointed at the stand-in)")
+    parser.add_argument("--port", type=int, default=8765, help="port for the app started by the test")
+    parser.add_argument("--gunicorn", action="store_true", help="start the app with gunicorn.conf.py")
+    parser.add_argument("--background", action="store_true", help="run the upstream callbacks as background jobs")
+    parser.add_argument("--thresholds", default=THRESHOLDS, help="json file with the limits per page")
+    parser.add_argument("--output", help="write the report as json to this file")
+    parser.add_argument("--record", action="store_true", help="fetch missing recordings from the real apis")
+    args = parser.parse_args()
+
+    stub = start_stub(args.upstream_delay, args.record)
+    stub_url = f"http://127.0.0.1:{stub.server_address[1]}"
+    print(f"stand-in upstreams on {stub_url}")
+
+    app = None
+    workdir = tempfile.TemporaryDirectory()
+    app_url = args.app_url
+    if app_url is None:
+        app_url = f"http://127.0.0.1:{args.port}"
+        app = start_app(stub_url, args.port, workdir.name, args.gunicorn, args.background)
+    try:
+        wait_until_warm(app_url)
+        lock = threading.Lock()
+        if args.warmup:
+            user(app_url, time.monotonic() + args.warmup, -1, [], lock)
+
+        results = []
+        started = time.monotonic()
+        threads = [
+            threading.Thread(target=user, args=(app_url, started + args.duration, seed, results, lock))
+            for seed in range(args.users)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        seconds = time.monotonic() - started
+    finally:
+        if app is not None:
+            os.killpg(app.pid, signal.SIGTERM)
+            app.wait(timeout=10)
+        stub.shutdown()
+        workdir.cleanup()
+
+    pages = report(results, seconds)
+    print(f"{args.users} users for {seconds:.1f}s, {len(results)} requests ({len(results) / seconds:.1f}/s)")
+    print(f"{'page':<12} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for page, n in pages.items():
+        cells = [f"{n[k]:8.1f}" if n[k] is not None else f"{'-':>8}" for k in ("rps", "p50_ms", "p95_ms", "p99_ms")]
+        print(f"{page:<12} {n['requests']:>8} {n['errors']:>6} {' '.join(cells)}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"users": args.users, "seconds": seconds, "pages": pages}, f, indent=2)
+
+    if args.thresholds and os.path.exists(args.thresholds):
+        with open(args.thresholds) as f:
+            failed = regressions(pages, json.load(f))
+        if failed:
+            print("over the thresholds:\n  " + "\n  ".join(failed))
+            sys.exit(1)
+        print(f"all pages within {os.path.relpath(args.thresholds)}")
+
+
+if __name__ == "__main__":
+    main()
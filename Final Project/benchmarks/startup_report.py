@@ -0,0 +1,88 @@
+# startup-time report: how long importing the app takes and which modules cost the most
+# it runs `python -X importtime -c "import finalprojectapp"` in a fresh interpreter
+# and writes the result as json so CI can keep it and compare runs
+#
+# run from the "Final Project" folder:
+#   python benchmarks/startup_report.py --output startup_report.json --budget-ms 1500
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# heavy modules that only callbacks need, importing them at boot is a regression
+LAZY_MODULES = ["pandas", "plotly.express", "bs4", "lxml", "numpy", "forecast"]
+
+
+# runs the import in a new python process and returns (module, self_us, cumulative_us, depth) rows
+def measure(module="finalprojectapp"):
+    env = dict(os.environ, START_REFRESHER="0") # no background downloads while measuring
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=APP_DIR, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise SystemExit(f"importing {module} failed:\n{proc.stderr}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def build_report(rows, top=25):
+    # total = cumulative time of the app module itself (the last, outermost row)
+    total_us = rows[-1][2] if rows else 0
+    # self time added up per top-level package (dash, plotly, numpy, ...)
+    packages = {}
+    for name, self_us, _, _ in rows:
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us
+    imported = {name for name, _, _, _ in rows}
+    return {
+        "total_ms": round(total_us / 1000, 1),
+        "modules_imported": len(rows),
+        "packages_ms": {
+            k: round(v / 1000, 1) for k, v in sorted(packages.items(), key=lambda kv: -kv[1])[:top]
+        },
+        "slowest_modules_ms": [
+            {"module": name, "self_ms": round(s / 1000, 1), "cumulative_ms": round(c / 1000, 1)}
+            for name, s, c, _ in sorted(rows, key=lambda r: -r[2])[:top]
+        ],
+        "eager_heavy_modules": [m for m in LAZY_MODULES if m in imported],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report per-module import cost of the app")
+    parser.add_argument("--output", help="write the json report to this file")
+    parser.add_argument("--budget-ms", type=float, help="fail if the app takes longer than this to import")
+    parser.add_argument("--repeat", type=int, default=3, help="measure this many times and keep the fastest")
+    args = parser.parse_args()
+
+    reports = [build_report(measure()) for _ in range(max(1, args.repeat))]
+    report = min(reports, key=lambda r: r["total_ms"])
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+    failed = False
+    if report["eager_heavy_modules"]:
+        print(f"FAIL: imported at startup but should be lazy: {', '.join(report['eager_heavy_modules'])}")
+        failed = True
+    if args.budget_ms is not None and report["total_ms"] > args.budget_ms:
+        print(f"FAIL: startup took {report['total_ms']} ms, budget is {args.budget_ms} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
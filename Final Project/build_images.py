@@ -0,0 +1,133 @@
+# build step: makes smaller copies of the pictures the pages show
+# every image used by the attraction cards, the cuisine picker and the hero banner gets
+# webp and jpeg copies at a few widths in assets/variants/, plus a manifest.json
+# that the pages read to build responsive <img srcset> tags
+#
+# needs Pillow (pip install pillow), run from the "Final Project" folder:
+#   python build_images.py
+import json
+import os
+import re
+import sys
+
+from PIL import Image, ImageOps
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+ASSETS_DIR = os.path.join(APP_DIR, "assets")
+VARIANTS_DIR = os.path.join(ASSETS_DIR, "variants")
+MANIFEST = os.path.join(VARIANTS_DIR, "manifest.json")
+
+WIDTHS = [320, 640, 960, 1440]  # pixel widths to generate (never wider than the original)
+FORMATS = {"webp": ("WEBP", {"quality": 78, "method": 6}), "jpg": ("JPEG", {"quality": 80, "optimize": True, "progressive": True})}
+HERO_IMAGE = "williamsburgpic.jpg"
+# the hero picture is a css background, these are the rules that use it
+HERO_SELECTORS = [
+    ".hero-section",
+    ".restaurants-hero-section::before",
+    ".weather-hero-section::before",
+    ".attractions-hero-section::before",
+]
+
+
+# every image file the pages refer to
+def referenced_images():
+    os.environ.setdefault("START_REFRESHER", "0")
+    sys.path.insert(0, APP_DIR)
+    import finalprojectapp  # registers the pages so their tables can be read
+    attractions = sys.modules["pages.finalprojectattractions"]
+    restaurants = sys.modules["pages.finalprojectrestaurants"]
+    names = set(attractions.ATTRACTIONS_IMAGES.values()) | set(restaurants.CUISINE_IMAGES.values())
+    names.add(HERO_IMAGE)
+    return sorted(names)
+
+
+# "water country.jpg" -> "water-country" (srcset entries can't contain spaces)
+def slug(name):
+    stem = os.path.splitext(name)[0]
+    return re.sub(r"[^a-z0-9]+", "-", stem.lower()).strip("-")
+
+
+def build_variants(name):
+    source = os.path.join(ASSETS_DIR, name)
+    with Image.open(source) as img:
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        widths = [w for w in WIDTHS if w < img.width] + [min(img.width, WIDTHS[-1])]
+        entry = {"width": img.width, "height": img.height, "variants": []}
+        for width in sorted(set(widths)):
+            height = round(img.height * width / img.width)
+            resized = None
+            for ext, (fmt, options) in FORMATS.items():
+                filename = f"{slug(name)}-{width}.{ext}"
+                target = os.path.join(VARIANTS_DIR, filename)
+                # skip files that are already newer than the original (incremental builds)
+                if not os.path.exists(target) or os.path.getmtime(target) < os.path.getmtime(source):
+                    if resized is None:
+                        resized = img.resize((width, height), Image.LANCZOS)
+                    resized.save(target, fmt, **options)
+                # a copy that is not smaller than the original is useless, the original is used instead
+                if os.path.getsize(target) >= os.path.getsize(source):
+                    os.remove(target)
+                    continue
+                entry["variants"].append({
+                    "file": f"variants/{filename}",
+                    "width": width,
+                    "format": ext,
+                    "bytes": os.path.getsize(target),
+                })
+    return entry
+
+
+# background-image rules for the hero banner, dash loads every .css file in assets automatically
+def hero_css(entry):
+    # only widths that have both a webp and a jpeg copy
+    widths = {v["width"] for v in entry["variants"] if v["format"] == "webp"} & {v["width"] for v in entry["variants"] if v["format"] == "jpg"}
+    largest = max(widths)
+    medium = min((w for w in widths if w >= 960), default=largest)
+
+    # urls are relative to this css file, which sits next to the variants
+    def image_set(width):
+        webp = f"{slug(HERO_IMAGE)}-{width}.webp"
+        jpg = f"{slug(HERO_IMAGE)}-{width}.jpg"
+        # plain url first for browsers without image-set()
+        return (
+            f"    background-image: url('{jpg}');\n"
+            f"    background-image: image-set(url('{webp}') type('image/webp'), url('{jpg}') type('image/jpeg'));\n"
+        )
+
+    selectors = ",\n".join(HERO_SELECTORS)
+    return (
+        "/* generated by build_images.py, do not edit */\n"
+        f"{selectors} {{\n{image_set(largest)}}}\n\n"
+        f"@media (max-width: 768px) {{\n{selectors} {{\n{image_set(medium)}}}\n}}\n"
+    )
+
+
+def main():
+    os.makedirs(VARIANTS_DIR, exist_ok=True)
+    manifest = {}
+    for name in referenced_images():
+        if not os.path.exists(os.path.join(ASSETS_DIR, name)):
+            print(f"missing: {name} (referenced by a page but not in assets/)")
+            continue
+        entry = build_variants(name)
+        original = os.path.getsize(os.path.join(ASSETS_DIR, name))
+        formats = {v["format"] for v in entry["variants"]}
+        if formats != set(FORMATS):
+            print(f"{name}: already small ({original // 1024} KB), original is used")
+            for v in entry["variants"]:
+                os.remove(os.path.join(ASSETS_DIR, v["file"]))
+            continue
+        manifest[name] = entry
+        smallest = min(v["bytes"] for v in entry["variants"])
+        print(f"{name}: {len(entry['variants'])} variants, {original // 1024} KB -> from {smallest // 1024} KB")
+
+    with open(MANIFEST, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    if HERO_IMAGE in manifest:
+        with open(os.path.join(VARIANTS_DIR, "hero.css"), "w") as f:
+            f.write(hero_css(manifest[HERO_IMAGE]))
+    print(f"wrote {MANIFEST}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# circuit breaker and adaptive timeout for one upstream host
+# after FAILURES failed or slow requests in a row the breaker opens and requests to that
+# host fail right away (the pages keep showing their last good or fallback data) instead
+# of each one waiting for a timeout. after a cooldown one request is let through to see
+# if the host is back: if it works the breaker closes, if not it stays open for longer.
+# the read timeout follows how fast the host usually answers (a few times its p99)
+# instead of a fixed number, so a slow host can't hold a thread for long. a request that
+# ran out of time counts as a response at its timeout, so the timeout grows again when the
+# host gets slower for good, and the probe gets the caller's whole timeout
+import os
+import threading
+import time
+from collections import deque
+
+FAILURES = 5  # failed or slow requests in a row that open the breaker
+COOLDOWN = 30  # seconds the breaker stays open before letting a probe through
+MAX_COOLDOWN = 300  # the cooldown doubles after every failed probe, up to this
+SAMPLES = 200  # recent response times kept per host
+MIN_SAMPLES = 20  # below this the caller's timeout is used as is
+TIMEOUT_FACTOR = 4  # adaptive timeout = this many times the p99 response time
+MIN_TIMEOUT = 2.0  # seconds, never go below this
+SLOW_FRACTION = 0.8  # a response that used this much of its timeout counts as slow
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, host, retry_in):
+        super().__init__(f"{host} is unavailable (circuit open, next try in {retry_in:.0f}s)")
+        self.host = host
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    def __init__(self, host):
+        self.host = host
+        self.state = CLOSED
+        self.failures = 0 # failed or slow requests in a row
+        self.opened_at = None
+        self.cooldown = COOLDOWN
+        self.trips = 0 # how many times the breaker opened
+        self.rejected = 0 # requests that failed fast
+        self.samples = deque(maxlen=SAMPLES) # recent response times (or timeouts) of answered and slow requests
+        self._timeout = None # adaptive read timeout, None until there are enough samples
+        self._probing = False
+        self._lock = threading.Lock()
+        os.register_at_fork(after_in_child=self.after_fork)
+
+    # a probe sent by the parent never reports back to a forked process
+    def after_fork(self):
+        self._probing = False
+        self._lock = threading.Lock()
+
+    # raises CircuitOpenError when the request should not be sent
+    # returns True when the request is the probe of a half-open breaker
+    def before_request(self):
+        with self._lock:
+            if self.state == CLOSED:
+                return False
+            retry_in = self.opened_at + self.cooldown - time.monotonic()
+            if self.state == OPEN and retry_in <= 0:
+                self.state = HALF_OPEN # cooldown is over, let one probe through
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+        raise CircuitOpenError(self.host, max(retry_in, 0))
+
+    # read timeout to use, at most the caller's own timeout (all of it for a probe, so a
+    # host that became slower can still answer it)
+    def timeout(self, limit, probe=False):
+        adaptive = self._timeout
+        if adaptive is None or probe:
+            return limit
+        return min(limit, adaptive)
+
+    # ok is False for errors (no answer, 429, 5xx), timeout is what the request was given,
+    # probe is what before_request returned
+    def record(self, seconds, ok, timeout, probe=False):
+        with self._lock:
+            slow = seconds >= timeout * SLOW_FRACTION
+            if ok or slow: # a request that ran out of time took at least its timeout
+                self.samples.append(max(seconds, timeout) if not ok else seconds)
+                self._timeout = self.adaptive_timeout()
+            if ok and not slow:
+                self.failures = 0
+                if self.state != CLOSED: # the probe worked
+                    self.state = CLOSED
+                    self.cooldown = COOLDOWN
+            else:
+                self.failures += 1
+                if self.state == HALF_OPEN: # the probe failed, wait longer this time
+                    self.cooldown = min(self.cooldown * 2, MAX_COOLDOWN)
+                    self.open()
+                elif self.state == CLOSED and self.failures >= FAILURES:
+                    self.open()
+            if probe:
+                self._probing = False
+
+    def open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.trips += 1
+
+    def adaptive_timeout(self):
+        if len(self.samples) < MIN_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+        return max(MIN_TIMEOUT, p99 * TIMEOUT_FACTOR)
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "trips": self.trips,
+                "rejected": self.rejected,
+                "timeout": self._timeout,
+            }
@@ -0,0 +1,32 @@
+# callbacks that can run in the browser instead of on the server
+# a callback that is only a lookup or a bit of string building does not need a round
+# trip to a worker: mark it with @clientside_eligible, give it the same logic in
+# javascript and the lookup tables it needs, and it is registered as a dash clientside
+# callback. the python function stays as the reference version and is used instead
+# when CLIENTSIDE_CALLBACKS=0 (handy when debugging)
+import json
+import os
+
+from dash import ClientsideFunction, callback, clientside_callback
+
+CLIENTSIDE_ENABLED = os.environ.get("CLIENTSIDE_CALLBACKS", "1") == "1"
+
+# names of the callbacks that run in the browser
+registry = []
+
+
+# js is a javascript function expression with the same arguments as the python function,
+# tables are json-able lookup tables it can read as `tables.<name>` (sent with the page once)
+# for longer code js can also be a ClientsideFunction pointing at a function in assets/*.js
+def clientside_eligible(*dependencies, js, tables=None, **kwargs):
+    def decorator(fn):
+        if not CLIENTSIDE_ENABLED:
+            return callback(*dependencies, **kwargs)(fn)
+        if isinstance(js, ClientsideFunction):
+            source = js
+        else:
+            source = f"(function (tables) {{\n    return {js.strip()};\n}})({json.dumps(tables or {})})"
+        clientside_callback(source, *dependencies, **kwargs)
+        registry.append(fn.__name__)
+        return fn
+    return decorator
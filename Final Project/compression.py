@@ -0,0 +1,90 @@
+# compresses what the server answers (callback json, page shells, /metrics) for browsers
+# that accept it: brotli when the brotli package is installed and the browser takes it,
+# gzip otherwise. small answers go out as they are, compressing them costs more than the
+# few bytes it saves. answers with an ETag (the frozen layouts and pages) are compressed
+# once and kept. files in assets/ are not touched, they are compressed ahead of time
+# (precompress_assets.py).
+# COMPRESS=0 turns it off, e.g. when a proxy in front of the app compresses instead
+#
+# the json itself comes from plotly's encoder (dash uses it for every answer), switched to
+# orjson below when it is installed: several times faster and no spaces between items
+import gzip
+import os
+
+import flask
+import plotly.io as pio
+
+from lrucache import LRUCache
+from metrics import watch_cache
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip alone still works
+    brotli = None
+
+try:
+    import orjson
+except ImportError:  # optional, pip install orjson
+    orjson = None
+
+ENABLED = os.environ.get("COMPRESS", "1") == "1"
+MIN_SIZE = 1024  # bytes, smaller answers are sent uncompressed
+GZIP_LEVEL = 5  # 1-9, past this the answers barely get smaller but take longer
+BROTLI_QUALITY = 5  # 0-11, the same trade-off for brotli
+COMPRESSIBLE = ("application/json", "text/html", "text/plain", "text/css", "application/javascript")
+
+compressed_cache = LRUCache(64) # (etag, encoding) -> compressed body
+watch_cache("compressed_responses", compressed_cache)
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+# best encoding both sides support, None to send the answer as it is
+def negotiate(accept_encodings):
+    if brotli is not None and accept_encodings["br"]:
+        return "br"
+    if accept_encodings["gzip"]:
+        return "gzip"
+    return None
+
+
+def compress_response(response):
+    if (
+        response.status_code != 200
+        or response.direct_passthrough
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE
+    ):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = negotiate(flask.request.accept_encodings)
+    if encoding is None:
+        return response
+    body = response.get_data()
+    if len(body) < MIN_SIZE:
+        return response
+    etag, _ = response.get_etag()
+    if etag:
+        key = (etag, encoding)
+        compressed = compressed_cache.get(key)
+        if compressed is None:
+            compressed = compress(body, encoding)
+            compressed_cache.put(key, compressed)
+        # the compressed bytes are another representation of the same answer
+        response.set_etag(etag, weak=True)
+    else:
+        compressed = compress(body, encoding)
+    response.set_data(compressed)
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def init_app(server):
+    if orjson is not None:
+        pio.json.config.default_engine = "orjson"
+    if ENABLED:
+        server.after_request(compress_response)
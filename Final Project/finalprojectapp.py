@@ -1,12 +1,27 @@
+import os
 import dash
 from dash import Dash, dcc, html
 import dash_bootstrap_components as dbc
+from refresher import refresher
+import staticassets
+import staticpages
+import metrics
+import compression
+import backgroundjobs
 
 
 #initialize the app
-app = Dash(__name__, use_pages=True, suppress_callback_exceptions=True, title = "Colonial Williamsburg Travel Guide", external_stylesheets=[dbc.themes.BOOTSTRAP])
+app = Dash(__name__, use_pages=True, suppress_callback_exceptions=True, title = "Colonial Williamsburg Travel Guide", external_stylesheets=[dbc.themes.BOOTSTRAP], include_assets_files=False)
 server = app.server #for deployment
 
+# files in assets/ are served from fingerprinted urls with long-lived caching (see staticassets.py)
+# so dash's own un-hashed asset tags are turned off above and added to the page below instead
+staticassets.init_app(server)
+metrics.init_app(app) # callback timings and sizes, served on /metrics
+static_pages = staticpages.init_app(app) # layout, callbacks and page shells serialized once (see staticpages.py)
+compression.init_app(server) # after metrics, so /metrics counts the compressed bytes (hooks run last to first)
+backgroundjobs.init_app(server) # with BACKGROUND_CALLBACKS=1: closes the job cache's connection after each request
+
 # Add custom CSS
 app.index_string = '''
 <!DOCTYPE html>
@@ -16,22 +31,68 @@ app.index_string = '''
         <title>{%title%}</title>
         {%favicon%}
         {%css%}
-        <link rel="stylesheet" href="/assets/style.css">
+        {%hashed_css%}
     </head>
     <body>
         {%app_entry%}
         <footer>
             {%config%}
             {%scripts%}
+            {%hashed_scripts%}
             {%renderer%}
         </footer>
     </body>
 </html>
-'''
+'''.replace("{%hashed_css%}", staticassets.css_tags()).replace("{%hashed_scripts%}", staticassets.script_tags())
 
 app.layout = html.Div([
     dash.page_container
 ])
 
+# the pages were imported by Dash above (use_pages)
+from pages import finalprojectattractions as attractions_page
+
+# keep the restaurant, weather and attraction data warm in the background
+# (START_REFRESHER=0 turns it off, e.g. when only measuring startup time)
+if os.environ.get("START_REFRESHER", "1") == "1":
+    refresher.start()
+
+# age (in seconds) and last error of every background dataset
+@server.route("/status/data")
+def data_status():
+    return refresher.status()
+
+# for the load balancer: the process is up
+@server.route("/health/live")
+def health_live():
+    return {"status": "ok"}
+
+# for the load balancer: 200 once every background dataset was downloaded (or tried and is
+# on its fallback), 503 while the worker is still warming up
+@server.route("/health/ready")
+def health_ready():
+    ready = refresher.ready()
+    body = {
+        "ready": ready,
+        "datasets": {name: d["age"] is not None for name, d in refresher.status().items()}, # False = on fallback data
+    }
+    return body, 200 if ready else 503
+
+# the attraction catalog, fetched once per browser session by the attractions page
+@server.route(attractions_page.CATALOG_PATH)
+def attraction_catalog():
+    return attractions_page.catalog_response()
+
+# etags of the layout, callbacks and page shells that are served from memory
+@server.route("/status/pages")
+def pages_status():
+    return static_pages.status()
+
+# request count and timing of every upstream host (shared http client)
+@server.route("/status/http")
+def http_status():
+    import httpclient
+    return httpclient.client.status()
+
 if __name__ == "__main__":
     app.run(debug=True)
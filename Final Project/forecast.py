@@ -0,0 +1,64 @@
+# hourly forecast stored as plain numpy arrays
+# the weather page only ever has ~48 rows, so the per-day min/max/mean are worked out
+# once when the forecast is downloaded instead of building a DataFrame on every callback
+import hashlib
+
+import numpy as np
+
+
+class Forecast:
+    def __init__(self, times, temp_c):
+        self.times = np.array(times, dtype="datetime64[m]")
+        self.temp_c = np.array(temp_c, dtype=float) # missing values (None) become nan
+        # Convert Celsius to Fahrenheit (done once per download)
+        self.temp_f = self.temp_c * 9/5 + 32
+        # same hours and temperatures -> same version, used to cache what is drawn from it
+        self.version = hashlib.blake2b(self.times.tobytes() + self.temp_c.tobytes(), digest_size=8).hexdigest()
+
+        # per-day aggregates, the hours come back from the api in order so every day is one run
+        days = self.times.astype("datetime64[D]")
+        self.dates, starts = np.unique(days, return_index=True)
+        if len(self.times):
+            valid = ~np.isnan(self.temp_f)
+            counts = np.add.reduceat(valid.astype(int), starts)
+            sums = np.add.reduceat(np.where(valid, self.temp_f, 0.0), starts)
+            # fmin/fmax skip nan the same way pandas does
+            self.day_min = np.fmin.reduceat(self.temp_f, starts)
+            self.day_max = np.fmax.reduceat(self.temp_f, starts)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                self.day_mean = sums / counts
+        else:
+            self.day_min = self.day_max = self.day_mean = np.array([], dtype=float)
+
+    # builds a forecast from the "hourly" part of the open-meteo response
+    @classmethod
+    def from_open_meteo(cls, hourly):
+        return cls(hourly["time"], hourly["temperature_2m"])
+
+    @classmethod
+    def empty(cls):
+        return cls([], [])
+
+    @property
+    def is_empty(self):
+        return len(self.times) == 0
+
+    def now(self):
+        return self.temp_f[0] # temp now
+
+    def min(self):
+        return np.nanmin(self.temp_f) # low
+
+    def max(self):
+        return np.nanmax(self.temp_f) # high
+
+    # rows for the summary table: date, min, max and average, rounded like the old table
+    def summary_rows(self):
+        dates = [str(d) for d in self.dates]
+        return list(zip(
+            dates,
+            np.round(self.day_min, 1).tolist(),
+            np.round(self.day_max, 1).tolist(),
+            np.round(self.day_mean, 1).tolist(),
+        ))
+
@@ -0,0 +1,113 @@
+# keeps sqlite out of the way while a background job process is forked
+# sqlite has mutexes of its own (in C, shared by every connection of the process): when one
+# thread forks while another thread is inside a sqlite call, the child can start with such
+# a mutex locked and its first sqlite call waits forever. every sqlite call of this process
+# runs under guard.shared(), a fork runs under guard.exclusive() and starts once none is
+# running (the calls are short, so a fork waits a few milliseconds at most)
+import functools
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class ForkGuard:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._active = 0 # sqlite calls running right now
+        self._forking = False
+        self._pending = [] # connections to close once the fork is done
+        os.register_at_fork(after_in_child=self.after_fork)
+
+    # the child starts with no sqlite call running and nobody forking
+    def after_fork(self):
+        self._cond = threading.Condition()
+        self._active = 0
+        self._forking = False
+        inherited.extend(self._pending)
+        self._pending = []
+
+    @contextmanager
+    def shared(self):
+        with self._cond:
+            while self._forking:
+                self._cond.wait()
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._cond.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        with self._cond:
+            while self._forking or self._active:
+                self._cond.wait()
+            self._forking = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._forking = False
+                pending, self._pending = self._pending, []
+                self._cond.notify_all()
+            if pending:
+                with self.shared():
+                    while pending:
+                        close_quietly(pending.pop()) # the last reference goes here, under the guard
+
+    # closes a connection without waiting: during a fork it is closed afterwards instead
+    # (a connection can be garbage collected in the very thread that is forking)
+    def close(self, conn):
+        with self._cond:
+            if self._forking:
+                self._pending.append(conn)
+                return
+            self._active += 1
+        try:
+            close_quietly(conn)
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._cond.notify_all()
+
+
+# a connection closed from another thread than its own is refused by sqlite3, it is
+# closed anyway once its last reference is gone
+def close_quietly(conn):
+    try:
+        conn.close()
+    except sqlite3.ProgrammingError:
+        pass
+
+
+guard = ForkGuard()
+
+
+# kept in the same thread-local storage as a connection: when the thread that opened it
+# ends, the connection is closed under the guard as well. a forked process never closes
+# the connections it inherited (sqlite says not to use them there), they are kept open
+class ConnectionCloser:
+    def __init__(self, conn):
+        self.conn = conn
+        self.pid = os.getpid()
+
+    def __del__(self):
+        if os.getpid() != self.pid:
+            inherited.append(self.conn)
+            return
+        guard.close(self.conn)
+
+
+inherited = [] # connections of the parent process, in a forked process
+
+
+# decorator for methods that talk to sqlite (and finish with it before they return)
+def sqlite_call(fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with guard.shared():
+            return fn(*args, **kwargs)
+    return wrapper
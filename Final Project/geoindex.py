@@ -0,0 +1,90 @@
+# small spatial index for places we already have in memory (restaurants, attractions)
+# points are dropped into a grid of square cells (about CELL_SIZE meters wide), so
+# "everything within R meters" and "the k closest" only look at nearby cells
+import math
+
+EARTH_RADIUS = 6371008.8  # meters
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS / 180
+CELL_SIZE = 500  # meters
+
+
+# great-circle distance in meters
+def distance_m(lat1, lon1, lat2, lon2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GeoIndex:
+    # items are (lat, lon, value) tuples, items without coordinates are skipped
+    def __init__(self, items, cell_size=CELL_SIZE):
+        self.cell_size = cell_size
+        self.points = [(lat, lon, value) for lat, lon, value in items if lat is not None and lon is not None]
+        # flat projection around the middle of the data, good enough to pick the cells
+        mid_lat = sum(p[0] for p in self.points) / len(self.points) if self.points else 0.0
+        self.lon_scale = math.cos(math.radians(mid_lat))
+        self.cells = {}
+        for point in self.points:
+            self.cells.setdefault(self.cell_of(point[0], point[1]), []).append(point)
+        if self.cells:
+            xs = [c[0] for c in self.cells]
+            ys = [c[1] for c in self.cells]
+            self.bounds = (min(xs), max(xs), min(ys), max(ys))
+
+    def __len__(self):
+        return len(self.points)
+
+    def cell_of(self, lat, lon):
+        x = lon * METERS_PER_DEGREE * self.lon_scale
+        y = lat * METERS_PER_DEGREE
+        return (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+
+    # everything within radius meters, as (distance, value) closest first
+    def within(self, lat, lon, radius):
+        if not self.cells:
+            return []
+        cx, cy = self.cell_of(lat, lon)
+        span = math.ceil(radius / self.cell_size) + 1 # one extra cell for the flat projection
+        # only the part of the square that has points in it, so a huge radius costs no more
+        # than looking at every point once
+        min_x, max_x, min_y, max_y = self.bounds
+        xs = range(max(cx - span, min_x), min(cx + span, max_x) + 1)
+        ys = range(max(cy - span, min_y), min(cy + span, max_y) + 1)
+        if len(xs) * len(ys) > len(self.cells): # fewer cells hold points than the square has
+            cells = (points for (x, y), points in self.cells.items() if x in xs and y in ys)
+        else:
+            cells = (self.cells.get((x, y), ()) for x in xs for y in ys)
+        found = []
+        for points in cells:
+            for p_lat, p_lon, value in points:
+                d = distance_m(lat, lon, p_lat, p_lon)
+                if d <= radius:
+                    found.append((d, value))
+        found.sort(key=lambda item: item[0])
+        return found
+
+    # the k closest points as (distance, value), looking at rings of cells further and
+    # further out until the k-th closest is certainly found
+    def nearest(self, lat, lon, k):
+        if not self.cells or k <= 0:
+            return []
+        cx, cy = self.cell_of(lat, lon)
+        min_x, max_x, min_y, max_y = self.bounds
+        max_ring = max(abs(cx - min_x), abs(cx - max_x), abs(cy - min_y), abs(cy - max_y)) + 1
+        found = []
+        for ring in range(max_ring + 1):
+            for x in range(cx - ring, cx + ring + 1):
+                for y in range(cy - ring, cy + ring + 1):
+                    if max(abs(x - cx), abs(y - cy)) != ring:
+                        continue # inner cells were done in earlier rings
+                    for p_lat, p_lon, value in self.cells.get((x, y), ()):
+                        found.append((distance_m(lat, lon, p_lat, p_lon), value))
+            # every point closer than `ring` whole cells has been seen by now
+            if len(found) >= k:
+                found.sort(key=lambda item: item[0])
+                if found[k - 1][0] <= ring * self.cell_size * 0.99:
+                    return found[:k]
+        found.sort(key=lambda item: item[0])
+        return found[:k]
@@ -0,0 +1,40 @@
+# production server settings (gunicorn), instead of the single-process app.run(debug=True)
+# the app is imported and its data downloaded once in the master process before the
+# workers are forked, so every worker starts with the page modules and warm data already
+# in memory (shared copy-on-write) and is ready right away.
+# each worker then starts its own background refresher, threads do not survive a fork
+#
+# pip install gunicorn, then from the "Final Project" folder:
+#   gunicorn -c gunicorn.conf.py
+# settings come from the environment, e.g. WEB_CONCURRENCY=4 WEB_THREADS=8 gunicorn -c gunicorn.conf.py
+import multiprocessing
+import os
+
+# the master warms the data itself (when_ready), the workers start the refresher in post_fork
+os.environ.setdefault("START_REFRESHER", "0")
+
+wsgi_app = "finalprojectapp:server"
+bind = os.environ.get("BIND", "0.0.0.0:8050")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "gthread"
+threads = int(os.environ.get("WEB_THREADS", 4))  # callbacks answered at the same time per worker
+keepalive = int(os.environ.get("WEB_KEEPALIVE", 5))  # seconds an idle keep-alive connection stays open
+timeout = int(os.environ.get("WEB_TIMEOUT", 30))  # a worker silent for this long is restarted
+graceful_timeout = int(os.environ.get("WEB_GRACEFUL_TIMEOUT", 30))
+preload_app = True
+WARM_TIMEOUT = float(os.environ.get("WARM_TIMEOUT", 60))  # seconds to wait for the first downloads
+
+
+# master, after the app is loaded and before any worker exists
+def when_ready(server):
+    from refresher import refresher
+    loaded = refresher.warm(timeout=WARM_TIMEOUT)
+    for name, ok in loaded.items():
+        server.log.info("warm %s: %s", name, "loaded" if ok else "not loaded, serving fallback data")
+
+
+# every new worker: its own refresher thread (locks, http connections and database
+# connections are renewed by the modules' own after-fork hooks)
+def post_fork(server, worker):
+    from refresher import refresher
+    refresher.start()
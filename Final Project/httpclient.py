@@ -0,0 +1,142 @@
+# one shared http client for every page
+# connections are pooled per host and kept alive between calls (no new TCP + TLS
+# handshake for every download), failed calls are retried a few times with a random
+# backoff, and the time every request took is recorded per host.
+# every host also has a circuit breaker (circuitbreaker.py): a host that keeps failing is
+# not asked again for a while, and read timeouts follow how fast the host usually answers
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import metrics
+from circuitbreaker import CircuitBreaker
+
+CONNECT_TIMEOUT = 3.05  # seconds to open the connection
+READ_TIMEOUT = 15  # seconds to wait for the answer
+POOL_CONNECTIONS = 10  # number of hosts to keep pools for
+POOL_MAXSIZE = 20  # open connections kept per host
+RETRIES = 2  # extra attempts after the first one
+BACKOFF = 0.5  # seconds, doubled after every failed attempt
+JITTER = 0.5  # up to this many random seconds added to every backoff
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+USER_AGENT = "ColonialWilliamsburgTravelGuide/1.0"
+
+
+def make_retry():
+    options = dict(
+        total=RETRIES,
+        backoff_factor=BACKOFF,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        respect_retry_after_header=True,
+        raise_on_status=False, # hand back the last response, raise_for_status() reports it
+    )
+    try:
+        return Retry(backoff_jitter=JITTER, **options)
+    except TypeError:  # urllib3 < 2 has no jitter option
+        return Retry(**options)
+
+
+class HostStats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.last_seconds = None
+        self.last_status = None
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "avg_seconds": self.total_seconds / self.requests if self.requests else None,
+            "max_seconds": self.max_seconds,
+            "last_seconds": self.last_seconds,
+            "last_status": self.last_status,
+        }
+
+
+class HttpClient:
+    def __init__(self):
+        self.session = self.make_session()
+        self.stats = {}
+        self.breakers = {}
+        self.listeners = [] # functions called as listener(host, seconds, status) after every request
+        self._lock = threading.Lock()
+        os.register_at_fork(after_in_child=self.after_fork)
+
+    def make_session(self):
+        session = requests.Session()
+        session.headers["User-Agent"] = USER_AGENT
+        adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, max_retries=make_retry())
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    # a forked process (gunicorn worker, background job) must not share the parent's open
+    # connections, it gets its own pool
+    def after_fork(self):
+        self.session = self.make_session()
+        self._lock = threading.Lock()
+
+    def breaker(self, host):
+        breaker = self.breakers.get(host)
+        if breaker is None:
+            with self._lock:
+                breaker = self.breakers.setdefault(host, CircuitBreaker(host))
+        return breaker
+
+    # timeout is the longest read timeout allowed (the breaker may use a shorter one),
+    # connect_timeout is how long to wait for the connection.
+    # raises circuitbreaker.CircuitOpenError right away while the host is considered down
+    def get(self, url, params=None, headers=None, timeout=READ_TIMEOUT, connect_timeout=CONNECT_TIMEOUT):
+        host = urlsplit(url).hostname
+        breaker = self.breaker(host)
+        probe = breaker.before_request()
+        timeout = breaker.timeout(timeout, probe)
+        started = time.perf_counter()
+        status = None
+        try:
+            r = self.session.get(url, params=params, headers=headers, timeout=(connect_timeout, timeout))
+            status = r.status_code
+            return r
+        finally:
+            seconds = time.perf_counter() - started
+            ok = status is not None and status < 500 and status != 429 # 4xx are our fault, not the host's
+            breaker.record(seconds, ok, timeout, probe)
+            self.record(host, seconds, status)
+
+    def record(self, host, seconds, status):
+        with self._lock:
+            stats = self.stats.setdefault(host, HostStats())
+            stats.requests += 1
+            stats.total_seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+            stats.last_seconds = seconds
+            stats.last_status = status
+            if status is None or status >= 400:
+                stats.errors += 1
+        for listener in self.listeners:
+            listener(host, seconds, status)
+
+    def status(self):
+        with self._lock:
+            stats = {host: s.as_dict() for host, s in self.stats.items()}
+        for host, breaker in list(self.breakers.items()):
+            stats.setdefault(host, {})["breaker"] = breaker.as_dict()
+        return stats
+
+
+# the client every page uses
+client = HttpClient()
+client.listeners.append(metrics.observe_upstream) # upstream latency per host on /metrics
+
+
+def get(url, **kwargs):
+    return client.get(url, **kwargs)
@@ -0,0 +1,339 @@
+# offline import of restaurants from OpenStreetMap extracts into restaurantstore.py
+# reads an .osm xml file (plain, .gz or .bz2, e.g. from download.geofabrik.de) or an
+# Overpass json dump one element at a time, so memory stays small whatever the file size,
+# and keeps every amenity=restaurant node, way and relation with its cuisine, phone and
+# website tags. once the store has restaurants the restaurants page reads them from there
+# instead of asking the Overpass API
+#
+# ways and relations have no coordinates of their own: the first pass notes which nodes
+# (and ways) they are made of, the next passes pick up just those and place the
+# restaurant at the middle of their bounding box, like Overpass' "out center"
+#
+# progress is saved every --batch elements, so an interrupted import carries on where it
+# stopped, and a file that has not changed since its last import is skipped. restaurants
+# that disappeared from a file since the last import are removed from the store
+#
+# run from the "Final Project" folder:
+#   python ingest_osm.py virginia-latest.osm.bz2
+import argparse
+import bz2
+import codecs
+import gzip
+import json
+import os
+import time
+import xml.etree.ElementTree as ET
+
+from restaurantstore import DB_PATH, RestaurantStore
+
+BATCH = 50000  # elements read between two saved checkpoints
+CHUNK = 1 << 20  # bytes read at a time from json dumps
+MAX_PASSES = 3  # restaurants, then their nodes and ways, then the nodes of relation ways
+
+
+def open_extract(path):
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def is_json(path):
+    return ".json" in os.path.basename(path)
+
+
+# ---- readers: both yield elements shaped like Overpass json ----
+
+def xml_elements(f):
+    context = ET.iterparse(f, events=("start", "end"))
+    _, root = next(context)
+    for event, elem in context:
+        if event != "end" or elem.tag not in ("node", "way", "relation"):
+            continue
+        element = {"type": elem.tag, "id": int(elem.get("id"))}
+        if elem.get("version") is not None:
+            element["version"] = int(elem.get("version"))
+        if elem.tag == "node":
+            element["lat"] = float(elem.get("lat"))
+            element["lon"] = float(elem.get("lon"))
+        tags = {}
+        nodes = []
+        members = []
+        for child in elem:
+            if child.tag == "tag":
+                tags[child.get("k")] = child.get("v")
+            elif child.tag == "nd":
+                nodes.append(int(child.get("ref")))
+            elif child.tag == "member":
+                members.append({"type": child.get("type"), "ref": int(child.get("ref"))})
+        if tags:
+            element["tags"] = tags
+        if elem.tag == "way":
+            element["nodes"] = nodes
+        elif elem.tag == "relation":
+            element["members"] = members
+        yield element
+        root.clear() # drop the elements already read, this is what keeps memory flat
+
+
+# the "elements" array of an Overpass json dump, decoded one object at a time
+def json_elements(f):
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8")() # a chunk can end in the middle of a character
+    buffer = ""
+    eof = False
+
+    def more():
+        nonlocal buffer, eof
+        chunk = f.read(CHUNK)
+        if not chunk:
+            eof = True
+        buffer += text.decode(chunk, final=eof)
+
+    # skip the header up to the opening bracket of "elements"
+    while True:
+        start = buffer.find('"elements"')
+        if start != -1 and buffer.find("[", start) != -1:
+            buffer = buffer[buffer.find("[", start) + 1:]
+            break
+        if eof:
+            return
+        more()
+
+    pos = 0
+    while True:
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+        if pos == len(buffer):
+            if eof:
+                return
+            buffer, pos = buffer[pos:], 0
+            more()
+            continue
+        if buffer[pos] == "]":
+            return
+        try:
+            element, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            buffer, pos = buffer[pos:], 0 # the object continues in the next chunk
+            more()
+            continue
+        yield element
+        pos = end
+
+
+def read_elements(path):
+    with open_extract(path) as f:
+        yield from (json_elements(f) if is_json(path) else xml_elements(f))
+
+
+def is_restaurant(element):
+    return element.get("tags", {}).get("amenity") == "restaurant"
+
+
+def osm_id(element):
+    return f"{element['type']}/{element['id']}"
+
+
+# middle of the bounding box, the same point Overpass gives with "out center"
+def center(points):
+    lats = [p[0] for p in points]
+    lons = [p[1] for p in points]
+    return (min(lats) + max(lats)) / 2, (min(lons) + max(lons)) / 2
+
+
+# ---- the import of one file ----
+
+class Ingest:
+    def __init__(self, store, path, batch=BATCH):
+        self.store = store
+        self.conn = store.connection()
+        self.path = path
+        self.source = os.path.abspath(path)
+        self.batch = batch
+        self.written = 0
+
+    # returns False when the file is unchanged since it was last fully imported
+    def start(self, restart=False):
+        st = os.stat(self.path)
+        row = self.conn.execute(
+            "SELECT size, mtime, run, pass, position, done FROM ingest_runs WHERE source = ?", (self.source,)
+        ).fetchone()
+        same_file = row is not None and (row[0], row[1]) == (st.st_size, st.st_mtime_ns)
+        if same_file and row[5] and not restart:
+            return False
+        if same_file and not restart:
+            self.run, self.pass_, self.position = row[2], row[3], row[4]
+            print(f"{self.path}: resuming pass {self.pass_} after {self.position} elements")
+            return True
+        # new or changed file: start over, rows from the last run stay until this one finishes
+        self.run = (row[2] + 1) if row is not None else 1
+        self.pass_, self.position = 1, 0
+        print(f"{self.path}: importing")
+        with self.conn:
+            self.conn.execute("DELETE FROM ingest_pending")
+            self.conn.execute("DELETE FROM ingest_nodes")
+            self.conn.execute("DELETE FROM ingest_ways")
+            self.conn.execute(
+                "INSERT OR REPLACE INTO ingest_runs (source, size, mtime, run, pass, position, done) "
+                "VALUES (?, ?, ?, ?, 1, 0, 0)",
+                (self.source, st.st_size, st.st_mtime_ns, self.run),
+            )
+        return True
+
+    def checkpoint(self, position):
+        self.conn.execute(
+            "UPDATE ingest_runs SET pass = ?, position = ? WHERE source = ?", (self.pass_, position, self.source)
+        )
+
+    # reads the file once, handing every element after the checkpoint to handle()
+    # handle() only queues sql, everything up to a checkpoint is committed together
+    def read_pass(self, handle):
+        started = time.perf_counter()
+        position = 0
+        self.conn.execute("BEGIN")
+        for element in read_elements(self.path):
+            position += 1
+            if position <= self.position:
+                continue # already done before the interruption
+            handle(element)
+            if position % self.batch == 0:
+                self.checkpoint(position)
+                self.conn.execute("COMMIT")
+                self.conn.execute("BEGIN")
+        self.pass_ += 1
+        self.position = 0
+        self.checkpoint(0)
+        self.conn.execute("COMMIT")
+        seconds = time.perf_counter() - started
+        print(f"  pass {self.pass_ - 1}: {position} elements in {seconds:.1f}s ({position / max(seconds, 1e-9):,.0f}/s)")
+
+    def save(self, element_id, version, tags, lat, lon):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO restaurants (osm_id, version, name, phone, website, cuisine, lat, lon, source, run) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (element_id, version, tags.get("name"), tags.get("phone"), tags.get("website"), tags.get("cuisine"),
+             lat, lon, self.source, self.run),
+        )
+        self.written += 1
+
+    # pass 1: restaurant nodes are saved right away, ways and relations wait for coordinates
+    def collect_restaurants(self, element):
+        if not is_restaurant(element):
+            return
+        tags = element["tags"]
+        if element["type"] == "node":
+            self.save(osm_id(element), element.get("version"), tags, element["lat"], element["lon"])
+        elif "center" in element: # overpass dumps made with "out center" already have it
+            self.save(osm_id(element), element.get("version"), tags, element["center"]["lat"], element["center"]["lon"])
+        else:
+            if element["type"] == "way":
+                members = [f"node/{n}" for n in element.get("nodes", [])]
+            else:
+                members = [f"{m['type']}/{m['ref']}" for m in element.get("members", []) if m["type"] in ("node", "way")]
+            self.conn.execute(
+                "INSERT OR REPLACE INTO ingest_pending (osm_id, version, tags, members) VALUES (?, ?, ?, ?)",
+                (osm_id(element), element.get("version"), json.dumps(tags), json.dumps(members)),
+            )
+
+    # ids of the nodes and ways the pending restaurants still need
+    def wanted(self):
+        nodes, ways = set(), set()
+        known_ways = dict(self.conn.execute("SELECT id, nodes FROM ingest_ways"))
+        for (members,) in self.conn.execute("SELECT members FROM ingest_pending"):
+            for member in json.loads(members):
+                kind, _, ref = member.partition("/")
+                if kind == "node":
+                    nodes.add(int(ref))
+                elif int(ref) in known_ways:
+                    nodes.update(json.loads(known_ways[int(ref)]))
+                else:
+                    ways.add(int(ref))
+        known_nodes = {n for (n,) in self.conn.execute("SELECT id FROM ingest_nodes")}
+        return nodes - known_nodes, ways
+
+    # passes 2 and 3: remember the coordinates and node lists that were asked for
+    def collect_members(self, nodes, ways):
+        def handle(element):
+            if element["type"] == "node" and element["id"] in nodes:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO ingest_nodes (id, lat, lon) VALUES (?, ?, ?)",
+                    (element["id"], element["lat"], element["lon"]),
+                )
+            elif element["type"] == "way" and element["id"] in ways:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO ingest_ways (id, nodes) VALUES (?, ?)",
+                    (element["id"], json.dumps(element.get("nodes", []))),
+                )
+        return handle
+
+    # turns every pending way/relation whose members are all known into a restaurant
+    def place_pending(self):
+        ways = {i: json.loads(n) for i, n in self.conn.execute("SELECT id, nodes FROM ingest_ways")}
+        coords = {i: (lat, lon) for i, lat, lon in self.conn.execute("SELECT id, lat, lon FROM ingest_nodes")}
+        placed = 0
+        with self.conn:
+            for element_id, version, tags, members in self.conn.execute(
+                "SELECT osm_id, version, tags, members FROM ingest_pending"
+            ).fetchall():
+                node_ids = []
+                for member in json.loads(members):
+                    kind, _, ref = member.partition("/")
+                    node_ids.extend([int(ref)] if kind == "node" else ways.get(int(ref), []))
+                points = [coords[n] for n in node_ids if n in coords]
+                if not points:
+                    continue
+                self.save(element_id, version, json.loads(tags), *center(points))
+                self.conn.execute("DELETE FROM ingest_pending WHERE osm_id = ?", (element_id,))
+                placed += 1
+        return placed
+
+    def finish(self):
+        with self.conn:
+            left = self.conn.execute("SELECT COUNT(*) FROM ingest_pending").fetchone()[0]
+            removed = self.conn.execute(
+                "DELETE FROM restaurants WHERE source = ? AND run < ?", (self.source, self.run)
+            ).rowcount
+            self.conn.execute("DELETE FROM ingest_pending")
+            self.conn.execute("DELETE FROM ingest_nodes")
+            self.conn.execute("DELETE FROM ingest_ways")
+            self.conn.execute("UPDATE ingest_runs SET done = 1 WHERE source = ?", (self.source,))
+        return left, removed
+
+    def run_all(self):
+        if self.pass_ == 1:
+            self.read_pass(self.collect_restaurants)
+        while self.pass_ <= MAX_PASSES:
+            nodes, ways = self.wanted()
+            if not nodes and not ways:
+                break
+            self.read_pass(self.collect_members(nodes, ways))
+        placed = self.place_pending()
+        left, removed = self.finish()
+        print(f"  {self.written} restaurants written ({placed} ways/relations placed), "
+              f"{removed} removed, {left} without a location skipped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import restaurants from OpenStreetMap extracts")
+    parser.add_argument("paths", nargs="+", help=".osm/.osm.gz/.osm.bz2 extracts or Overpass .json dumps")
+    parser.add_argument("--db", default=DB_PATH, help="restaurant store to write (default: %(default)s)")
+    parser.add_argument("--batch", type=int, default=BATCH, help="elements between saved checkpoints")
+    parser.add_argument("--restart", action="store_true", help="import again even if unchanged or half done")
+    args = parser.parse_args()
+
+    store = RestaurantStore(args.db)
+    for path in args.paths:
+        ingest = Ingest(store, path, batch=args.batch)
+        if not ingest.start(restart=args.restart):
+            print(f"{path}: unchanged since the last import, skipped")
+            continue
+        ingest.run_all()
+    print(f"{store.count()} restaurants in {args.db}")
+
+
+if __name__ == "__main__":
+    main()
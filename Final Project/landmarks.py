@@ -0,0 +1,16 @@
+# approximate locations of the places the site talks about (lat, lon)
+# used by the spatial index to find restaurants and attractions near each other
+HISTORIC_AREA = (37.2707, -76.7075)  # same point the restaurant search is centred on
+
+ATTRACTION_LOCATIONS = {
+    "Colonial Williamsburg (Governor's Palace, trades, reenactments)": (37.2748, -76.7016),
+    "DeWitt Wallace Decorative Arts Museum": (37.2685, -76.7030),
+    "Abby Aldrich Rockefeller Folk Art Museum": (37.2686, -76.7028),
+    "Muscarelle Museum of Art": (37.2693, -76.7150),
+    "Busch Gardens Williamsburg": (37.2357, -76.6456),
+    "Water Country USA": (37.2461, -76.6290),
+    "Jamestown Settlement": (37.2227, -76.7834),
+    "American Revolution Museum at Yorktown": (37.2276, -76.5187),
+    "Kimball Theatre": (37.2712, -76.7046),
+    "Merchants Square": (37.2714, -76.7050),
+}
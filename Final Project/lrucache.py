@@ -0,0 +1,51 @@
+# small thread-safe cache that holds at most `maxsize` entries
+# when it is full the entry that was used the longest time ago is thrown out
+from collections import OrderedDict
+import os
+import threading
+
+
+class LRUCache:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        os.register_at_fork(after_in_child=self.after_fork)
+
+    # a forked process (background job) gets a fresh lock, another thread may have held this one
+    def after_fork(self):
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key) # mark as most recently used
+            self.hits += 1
+            return self._data[key]
+
+    # like get, but not counted in hits/misses and the entry is not marked as used
+    # (for checking again after waiting, when get already counted the lookup)
+    def peek(self, key, default=None):
+        with self._lock:
+            return self._data.get(key, default)
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False) # drop the least recently used entry
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,160 @@
+# numbers about how the site is doing, served as prometheus text on /metrics
+# - how long every server callback takes and how big its answer is
+# - how long every upstream request takes, per host (fed by the shared http client)
+# - how long the parsing / building steps take (timed())
+# - hit ratios of the caches (read when /metrics is asked for)
+# recording a value is a bisect and an addition under a lock, cheap enough to leave on.
+# every worker process keeps its own numbers
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)  # seconds
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)  # bytes
+CALLBACK_PATH = "/_dash-update-component"
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Histogram:
+    def __init__(self, name, help, label, buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._series = {} # label value -> [count per bucket..., +Inf count, sum]
+        self._lock = threading.Lock()
+        os.register_at_fork(after_in_child=self.after_fork)
+
+    def after_fork(self):
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [0] * (len(self.buckets) + 2)
+            series[i] += 1
+            series[-1] += value
+
+    def lines(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        for label_value, counts in sorted(series.items()):
+            label = f'{self.label}="{escape(label_value)}"'
+            total = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                total += count
+                yield f'{self.name}_bucket{{{label},le="{format_value(bound)}"}} {total}'
+            yield f"{self.name}_sum{{{label}}} {format_value(counts[-1])}"
+            yield f"{self.name}_count{{{label}}} {total}"
+
+
+class Registry:
+    def __init__(self):
+        self.histograms = []
+        self.caches = {} # name -> function returning (hits, misses)
+
+    def histogram(self, name, help, label, buckets=DURATION_BUCKETS):
+        histogram = Histogram(name, help, label, buckets)
+        self.histograms.append(histogram)
+        return histogram
+
+    # cache is anything with hits and misses counters (LRUCache), or a function returning them
+    def watch_cache(self, name, cache):
+        self.caches[name] = cache if callable(cache) else (lambda: (cache.hits, cache.misses))
+
+    def cache_lines(self):
+        stats = {name: read() for name, read in sorted(self.caches.items())}
+        for metric, kind, pick in (
+            ("cache_hits_total", "counter", lambda h, m: h),
+            ("cache_misses_total", "counter", lambda h, m: m),
+            ("cache_hit_ratio", "gauge", lambda h, m: h / (h + m) if h + m else 0.0),
+        ):
+            yield f"# TYPE {metric} {kind}"
+            for name, (hits, misses) in stats.items():
+                yield f'{metric}{{cache="{escape(name)}"}} {format_value(pick(hits, misses))}'
+
+    def render(self):
+        lines = []
+        for histogram in self.histograms:
+            lines.extend(histogram.lines())
+        lines.extend(self.cache_lines())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+callback_seconds = registry.histogram(
+    "dash_callback_duration_seconds", "Time spent answering a server callback", "callback")
+callback_bytes = registry.histogram(
+    "dash_callback_response_bytes", "Size of a server callback answer", "callback", SIZE_BUCKETS)
+upstream_seconds = registry.histogram(
+    "upstream_request_duration_seconds", "Time of a request to an upstream api", "host")
+stage_seconds = registry.histogram(
+    "stage_duration_seconds", "Time spent parsing or building data", "stage")
+
+
+def watch_cache(name, cache):
+    registry.watch_cache(name, cache)
+
+
+# with timed("parse_attractions"): ... records how long the block took
+@contextmanager
+def timed(stage):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_seconds.observe(stage, time.perf_counter() - started)
+
+
+# listener for the http client: listener(host, seconds, status)
+def observe_upstream(host, seconds, status):
+    upstream_seconds.observe(host or "unknown", seconds)
+
+
+# times every /_dash-update-component request and serves /metrics on the flask server
+def init_app(app):
+    import flask
+    server = app.server
+    names = {} # callback output string -> python function name
+
+    def callback_name(output):
+        name = names.get(output)
+        if name is None:
+            fn = app.callback_map.get(output, {}).get("callback")
+            name = names[output] = getattr(fn, "__name__", None) or output
+        return name
+
+    @server.before_request
+    def start_timer():
+        if flask.request.path.endswith(CALLBACK_PATH):
+            flask.g.metrics_started = time.perf_counter()
+
+    @server.after_request
+    def record_callback(response):
+        started = flask.g.pop("metrics_started", None)
+        if started is not None:
+            body = flask.request.get_json(silent=True) or {}
+            name = callback_name(body.get("output", "unknown"))
+            callback_seconds.observe(name, time.perf_counter() - started)
+            if not response.direct_passthrough:
+                callback_bytes.observe(name, response.calculate_content_length() or 0)
+        return response
+
+    @server.route("/metrics")
+    def metrics():
+        return flask.Response(registry.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
@@ -1,9 +1,21 @@
-from dash import html, register_page, dcc, callback, Output, Input
-import requests
-from bs4 import BeautifulSoup
+from dash import html, register_page, dcc, no_update, ClientsideFunction, Output, Input, State
+import json
+import os
 import random
 import dash_bootstrap_components as dbc
+from refresher import refresher
+from responsiveimages import image_sources
+from singleflight import flights
+from clientside import clientside_eligible
+from ratings import store as ratings
+from metrics import timed, watch_cache
+from geoindex import GeoIndex
+from landmarks import ATTRACTION_LOCATIONS
+from sharedcache import shared_cache
+from staticpages import Frozen
+from lrucache import LRUCache
 
+# the http client and bs4/lxml are imported inside fetch_attractions so they load on first use
 register_page(__name__, path="/attractions", name="Attractions")
 
 layout = dbc.Container([
@@ -24,6 +36,8 @@ layout = dbc.Container([
     # Main Content
     dbc.Row([
         dbc.Col([
+            dcc.Store(id="attraction-catalog", storage_type="session"), # every attraction, fetched once per browser session
+            dcc.Store(id="attraction-queue", storage_type="session"), # attractions not shown yet, in shuffled order
             dcc.Loading(
                 html.Div(id="attraction-site", className="attraction-result-container"),
                 type="circle",
@@ -62,29 +76,182 @@ ATTRACTIONS_IMAGES = {
 }
 
 
+# page the attractions are scraped from, can be pointed somewhere else (e.g. the load test's stand-in server)
+ATTRACTIONS_URL = os.environ.get(
+    "ATTRACTIONS_URL", "https://www.visitwilliamsburg.com/things-to-do/museums-and-attractions/"
+)
+
+# revalidating is cheap (usually a 304) so the list is checked every hour
+ATTRACTIONS_REFRESH = 60 * 60  # seconds between revalidations
+
+# the last successful scrape is shared with the other workers (sharedcache.py) with its
+# validators, sent back so the website can answer "304 Not Modified" instead of the whole
+# page when nothing changed: {"etag", "last_modified", "attractions"}
+SCRAPE_KEY = "attractions-scrape"
+
+
+# true for a class attribute that contains "attraction-item" (the parser may hand over
+# the raw string "attraction-item card" or an already split list)
+def is_attraction_class(value):
+    if not value:
+        return False
+    classes = value.split() if isinstance(value, str) else value
+    return "attraction-item" in classes
+
+
+# pulls the attraction names out of the page
+# only the div.attraction-item blocks are turned into a tree, the rest of the page is skipped
+def parse_attractions(html_bytes):
+    from bs4 import BeautifulSoup, SoupStrainer
+    only_items = SoupStrainer("div", class_=is_attraction_class)
+    with timed("parse_attractions"):
+        soup = BeautifulSoup(html_bytes, 'lxml', parse_only=only_items)
+        names = (blk.get_text(strip=True) for blk in soup.find_all("div", class_="attraction-item"))
+        return [name for name in names if name]
+
+
+# scrapes the attraction names, errors are raised so the refresher keeps the last good list
+def scrape_attractions():
+    import httpclient
+    scrape = shared_cache.get(SCRAPE_KEY)
+    if scrape is not None:
+        return scrape["attractions"] # another worker checked the page less than an hour ago
+    headers = {}
+    last = shared_cache.entry(SCRAPE_KEY) # expired, but its validators still work
+    if last is not None:
+        if last.value["etag"]:
+            headers["If-None-Match"] = last.value["etag"]
+        if last.value["last_modified"]:
+            headers["If-Modified-Since"] = last.value["last_modified"]
+    r = httpclient.get(ATTRACTIONS_URL, headers=headers, timeout=5)
+    if r.status_code == 304:
+        shared_cache.set(SCRAPE_KEY, last.value, ATTRACTIONS_REFRESH)
+        return last.value["attractions"] # page did not change, keep the list we have
+    r.raise_for_status()
+    attractions = parse_attractions(r.content)
+    if not attractions: # the page changed its markup, keep the last good list
+        raise ValueError(f"no attractions found on {ATTRACTIONS_URL}")
+    shared_cache.set(SCRAPE_KEY, {
+        "etag": r.headers.get("ETag"),
+        "last_modified": r.headers.get("Last-Modified"),
+        "attractions": attractions,
+    }, ATTRACTIONS_REFRESH)
+    return attractions
+
+
+# rating (0-100) of an attraction from the ratings store
+# the scores in FALLBACK_ATTRACTIONS are put in the store the first time it is needed
+ratings_seeded = False
+
+def attraction_rating(name):
+    global ratings_seeded
+    if not ratings_seeded:
+        ratings.seed_attractions(FALLBACK_ATTRACTIONS)
+        ratings_seeded = True
+    rating = ratings.get("attraction", name)
+    return int(round(rating.average)) if rating else 0
+
+
+# threads asking at the same time share one scrape
 def fetch_attractions():
-    try:
-        url = "https://www.visitwilliamsburg.com/things-to-do/museums-and-attractions/"
-        r = requests.get(url, timeout=5)
-        r.raise_for_status()
-        soup = BeautifulSoup(r.text, 'lxml')
-        blocks = soup.select('div.attraction-item')
-        attractions = [
-            blk.get_text(strip=True)
-            for blk in blocks
-            if blk.get_text(strip=True)
-        ]
-        return attractions if attractions else FALLBACK_ATTRACTIONS
-    except Exception:
-        return FALLBACK_ATTRACTIONS
-
-
-# ✅ COMBINED callback for name and image
-@callback(
+    return flights.do("attractions", scrape_attractions)
+
+
+# the list is scraped in the background and kept in memory, browsers get it with the catalog below
+attractions_data = refresher.register("attractions", fetch_attractions, interval=ATTRACTIONS_REFRESH, default=FALLBACK_ATTRACTIONS)
+
+
+# where the attractions are, to suggest others close to the one picked
+attraction_index = GeoIndex((lat, lon, name) for name, (lat, lon) in ATTRACTION_LOCATIONS.items())
+NEARBY_COUNT = 2
+METERS_PER_MILE = 1609.344
+
+# "Merchants Square (0.1 mi), Kimball Theatre (0.2 mi)" for the attractions closest to this one
+def nearby_attractions(name):
+    location = ATTRACTION_LOCATIONS.get(name)
+    if location is None: # scraped attractions we have no location for
+        return None
+    closest = attraction_index.nearest(*location, NEARBY_COUNT + 1) # +1 since the attraction finds itself
+    others = [(d, other) for d, other in closest if other != name][:NEARBY_COUNT]
+    return ", ".join(f"{other} ({d / METERS_PER_MILE:.1f} mi)" for d, other in others)
+
+
+# the attraction catalog the browser keeps for the session: everything a card shows, so
+# picking and drawing one needs no server (assets/attractions.js). served on CATALOG_PATH
+CATALOG_PATH = "/data/attractions.json"
+CATALOG_MAX_AGE = 300  # seconds a CDN may keep the catalog, new browser sessions see changes after that
+
+def catalog_entry(name):
+    image_file = ATTRACTIONS_IMAGES.get(name, "other.jpg")
+    return {
+        "name": name,
+        "rating": attraction_rating(name),
+        # responsive copies from build_images.py, None when there is no picture
+        "image": image_sources(image_file) if image_file and image_file != "other.jpg" else None,
+        "nearby": nearby_attractions(name),
+    }
+
+
+def attraction_catalog():
+    # Handle both dict and string formats
+    names = (a["name"] if isinstance(a, dict) else a for a in attractions_data.get())
+    return [catalog_entry(name) for name in dict.fromkeys(names)]
+
+
+# the catalog as json, with an ETag so a CDN (or a browser starting a new session) can revalidate it
+# built again only when a new list was scraped or ratings were added
+catalog_cache = LRUCache(4) # (list downloaded at, ratings version) -> Frozen json
+watch_cache("attraction_catalog", catalog_cache)
+
+def catalog_key():
+    return attractions_data.loaded_at, ratings.version
+
+def catalog_response():
+    frozen = catalog_cache.get(catalog_key())
+    if frozen is None:
+        body = json.dumps(attraction_catalog(), separators=(",", ":")).encode("utf-8")
+        frozen = Frozen(body, "application/json")
+        catalog_cache.put(catalog_key(), frozen) # after building, seeding the ratings moves the version
+    return frozen.response(f"public, max-age=0, s-maxage={CATALOG_MAX_AGE}")
+
+
+# fills the session's catalog store the first time the page is opened, later visits in
+# the same session find it already there and send nothing
+@clientside_eligible(
+    Output("attraction-catalog", "data"),
+    Input("attraction-catalog", "modified_timestamp"),
+    State("attraction-catalog", "data"),
+    js=ClientsideFunction(namespace="attractions", function_name="load"),
+)
+def load_catalog(modified, catalog):
+    return attraction_catalog() if not catalog else no_update
+
+
+# next position of the session's shuffle queue: every attraction is shown once before any
+# is shown again, and a new round doesn't start with the one just shown
+# queue is {"size": catalog length, "order": [catalog positions left], "last": position shown}
+def next_in_queue(queue, size):
+    order = list(queue["order"]) if queue and queue.get("size") == size else []
+    last = queue.get("last") if queue else None
+    if not order:
+        order = list(range(size))
+        random.shuffle(order)
+        if size > 1 and order[0] == last:
+            order[0], order[-1] = order[-1], order[0]
+    position = order.pop(0)
+    return position, {"size": size, "order": order, "last": position}
+
+
+# picks the next attraction and draws its card (runs in the browser, assets/attractions.js)
+@clientside_eligible(
     Output("attraction-site", "children"),
-    Input("btn-attraction", "n_clicks")
+    Output("attraction-queue", "data"),
+    Input("btn-attraction", "n_clicks"),
+    Input("attraction-catalog", "data"),
+    State("attraction-queue", "data"),
+    js=ClientsideFunction(namespace="attractions", function_name="pick"),
 )
-def update_attraction(n_clicks):
+def pick_attraction(n_clicks, catalog, queue):
     if not n_clicks:
         return html.Div([
             html.Div([
@@ -92,34 +259,28 @@ def update_attraction(n_clicks):
                 html.H3("Ready to Explore?", className="attractions-placeholder-title"),
                 html.P("Click the button above to discover your next adventure in Williamsburg!", className="attractions-placeholder-text")
             ], className="attractions-placeholder")
-        ], className="attraction-result-container")
+        ], className="attraction-result-container"), no_update
+    if not catalog:
+        return no_update, no_update # still loading, the card is drawn when the catalog arrives
 
-    attractions = fetch_attractions()
-    selected = random.choice(attractions)
-    
-    # Handle both dict and string formats
-    if isinstance(selected, dict):
-        attraction_name = selected["name"]
-        attraction_rating = selected.get("rating", 0)
-    else:
-        attraction_name = selected
-        attraction_rating = 0
+    position, queue = next_in_queue(queue, len(catalog))
+    return attraction_card(catalog[position]), queue
 
-    # Get image file
-    image_file = ATTRACTIONS_IMAGES.get(attraction_name, "other.jpg")
-    image_path = f"/assets/{image_file}"
-    
-    # Create star rating
-    stars = "★" * (attraction_rating // 20) + "☆" * (5 - (attraction_rating // 20))
+
+def attraction_card(entry):
+    attraction_name = entry["name"]
+    rating = entry["rating"]
+    nearby = entry["nearby"]
     
     # Create image section - show fallback if no image file
-    if image_file == "other.jpg" or not image_file:
+    if entry["image"] is None:
         image_section = html.Div([
             html.I(className="fas fa-image attraction-fallback-icon"),
             html.Span("Image not available", className="attraction-fallback-text")
         ], className="attraction-image-fallback")
     else:
-        image_section = html.Img(src=image_path, className="attraction-image")
+        # responsive copies from build_images.py, the browser picks the smallest one that fits the card
+        image_section = html.Img(**entry["image"], sizes="(max-width: 768px) 100vw, 900px", className="attraction-image")
     
     # Create modern attraction card
     attraction_card = html.Div([
@@ -131,8 +292,8 @@ def update_attraction(n_clicks):
                 html.Div([
                     html.H2(attraction_name, className="attraction-name"),
                     html.Div([
-                        html.Span(stars, className="attraction-rating"),
-                        html.Span(f"{attraction_rating}/100", className="attraction-rating-number")
+                        html.Span(id="attraction-stars", className="attraction-rating"), # filled in by attraction_stars
+                        html.Span(f"{rating}/100", id="attraction-rating-number", className="attraction-rating-number")
                     ], className="attraction-rating-container")
                 ], className="attraction-header"),
                 html.Div([
@@ -142,10 +303,28 @@ def update_attraction(n_clicks):
                 html.Div([
                     html.I(className="fas fa-star attraction-icon"),
                     html.Span("Highly Recommended", className="attraction-recommendation")
-                ], className="attraction-recommendation-container")
+                ], className="attraction-recommendation-container"),
+                html.Div([
+                    html.I(className="fas fa-walking attraction-icon"),
+                    html.Span(f"Also nearby: {nearby}", className="attraction-location")
+                ], className="attraction-location-container") if nearby else None
             ], className="attraction-content")
         ], className="attraction-card")
     ], className="attraction-result")
 
     return attraction_card
 
+
+# star string for the card, e.g. "89/100" -> ★★★★☆ (runs in the browser)
+@clientside_eligible(
+    Output("attraction-stars", "children"),
+    Input("attraction-rating-number", "children"),
+    js="""
+    function (rating) {
+        var full = Math.floor(parseInt(rating, 10) / 20);
+        return "★".repeat(full) + "☆".repeat(5 - full);
+    }""",
+)
+def attraction_stars(rating):
+    full = int(rating.split("/")[0]) // 20
+    return "★" * full + "☆" * (5 - full)
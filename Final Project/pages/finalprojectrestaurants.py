@@ -1,8 +1,19 @@
 # import necessary packages for the website (imported all of them since I am unsure which ones I will need)
 # no math ones for obvious reasons
-from dash import html, dcc, callback, Input, Output, register_page
-import requests
+import os
+from dash import html, dcc, ctx, no_update, ClientsideFunction, Input, Output, State, register_page
 import dash_bootstrap_components as dbc
+from restaurantcatalog import RestaurantCatalog
+from responsiveimages import image_sources
+from singleflight import flights
+from clientside import clientside_eligible
+from ratings import store as ratings
+from restaurantstore import store as restaurant_store
+from metrics import timed
+from geoindex import distance_m
+from backgroundjobs import background_callback
+from sharedcache import shared_cache
+from landmarks import HISTORIC_AREA, ATTRACTION_LOCATIONS
 
 # registers the page and makes it possible to access from the home page
 register_page(__name__, path='/restaurants', name="Restaurants")
@@ -10,6 +21,8 @@ register_page(__name__, path='/restaurants', name="Restaurants")
 # Williamsburg coordinates
 LAT, LON = 37.2707, -76.7075
 RADIUS = 16000  # ~10 miles in meters
+# Overpass endpoint, can be pointed somewhere else (e.g. the load test's stand-in server)
+OVERPASS_URL = os.environ.get("OVERPASS_URL", "https://overpass-api.de/api/interpreter")
 
 # Cuisine categories mapping
 # multiple for some since they are similar
@@ -33,6 +46,23 @@ CUISINE_IMAGES = {
     "Seafood": "seafood.jpg",
     "Other": "other.jpg"
 }
+# ways to order the results
+SORT_OPTIONS = {
+    "default": "Best Match",
+    "rating": "Top Rated",
+    "distance": "Closest",
+}
+# places to search around, the historic area first and then every attraction
+NEAR_POINTS = {"Historic Area": HISTORIC_AREA, **ATTRACTION_LOCATIONS}
+METERS_PER_MILE = 1609.344
+# how far from that place, in miles (0 means no limit)
+RADIUS_OPTIONS = {
+    0: "Anywhere",
+    0.5: "Within 1/2 mile",
+    1: "Within 1 mile",
+    2: "Within 2 miles",
+    5: "Within 5 miles",
+}
 # layout of website
 layout = dbc.Container([
     # Hero Section
@@ -53,7 +83,7 @@ layout = dbc.Container([
                 html.Div([
                     dbc.Row([
                         dbc.Col([
-                            html.Img(id="cuisine-img", className="cuisine-image")
+                            html.Img(id="cuisine-img", sizes="(max-width: 768px) 100vw, 50vw", className="cuisine-image")
                         ], md=6),
                         dbc.Col([
                             html.Div([
@@ -65,6 +95,29 @@ layout = dbc.Container([
                                     clearable=False,
                                     className="cuisine-dropdown"
                                 ),
+                                html.Label("Sort By:", className="search-label"),
+                                dcc.Dropdown(
+                                    id="sort-dd",
+                                    options=[{"label": label, "value": value} for value, label in SORT_OPTIONS.items()],
+                                    value="default",
+                                    clearable=False,
+                                    className="cuisine-dropdown"
+                                ),
+                                html.Label("Near:", className="search-label"),
+                                dcc.Dropdown(
+                                    id="near-dd",
+                                    options=[{"label": k, "value": k} for k in NEAR_POINTS.keys()],
+                                    value="Historic Area",
+                                    clearable=False,
+                                    className="cuisine-dropdown"
+                                ),
+                                dcc.Dropdown(
+                                    id="radius-dd",
+                                    options=[{"label": label, "value": value} for value, label in RADIUS_OPTIONS.items()],
+                                    value=0,
+                                    clearable=False,
+                                    className="cuisine-dropdown"
+                                ),
                                 dbc.Button("Search Restaurants", id="search-btn", n_clicks=0, className="search-button")
                             ], className="search-controls")
                         ], md=6)
@@ -77,17 +130,27 @@ layout = dbc.Container([
     # Restaurant Grid Section
     dbc.Row([
         dbc.Col([
+            dcc.Store(id="restaurant-page"), # current page of results (compact columns)
+            dcc.Store(id="restaurant-cursor"), # where the shown page starts, moved by the pager
+            html.Div(id="restaurant-status", className="loading-status"), # progress of a running search
             dcc.Loading(
                 html.Div(id="restaurant-list", className="restaurant-list"),
                 type="circle",
                 color="#8B4513"
-            )
+            ),
+            html.Div([
+                dbc.Button("‹ Previous", id="restaurant-prev", n_clicks=0, disabled=True, className="pager-button"),
+                html.Span(id="restaurant-range", className="pager-range"),
+                dbc.Button("Next ›", id="restaurant-next", n_clicks=0, disabled=True, className="pager-button")
+            ], className="restaurant-pager")
         ], width=12)
     ], className="restaurant-grid-row")
 ], fluid=True, className="restaurants-container")
 
-# function that gets restaurants from Overpass API that matches the cuisine filter
-def fetch_restaurants(cuisine_filter):
+# function that gets every restaurant around Williamsburg from the Overpass API
+# one query covers all cuisines, the catalog below does the filtering
+def download_all_restaurants():
+    import httpclient # imported here so it only loads when restaurants are first downloaded
     query = f"""
     [out:json][timeout:15];
     (
@@ -95,97 +158,249 @@ def fetch_restaurants(cuisine_filter):
       way["amenity"="restaurant"](around:{RADIUS},{LAT},{LON});
       relation["amenity"="restaurant"](around:{RADIUS},{LAT},{LON});
     );
-    out center 50;
+    out center;
     """
     # gets the restaurant data from the Overpass API
-    # the data query part is the above where the requests only looks for restaurants in that vicinity 
-    try:
-        r = requests.get("https://overpass-api.de/api/interpreter", params={'data': query}, timeout=15) # timeout after 15 seconds
-        r.raise_for_status()
-        data = r.json()["elements"]  # all the restaurants as a list
-    except requests.RequestException:
-        return [] # returns empty list if there is an error
-
-    results = []
-    # loops through the data and filters it based on the cuisine type
-    for restaurant in data:
-        tags = restaurant.get("tags", {})
-        cuisines = tags.get("cuisine", "").lower().split(";") # same format for all cuisines
-        if CUISINE_CATEGORIES[cuisine_filter]: # which restaurants fit in the cuisine filter
-            if not any(c in cuisines for c in CUISINE_CATEGORIES[cuisine_filter]):
-                continue
-        results.append({
-            "name": tags.get("name", "Unnamed"), # name of restaurant
-            "phone": tags.get("phone", "Please refer to the website for a phone number."), # phone number if availible
-            "website": tags.get("website", "There is no website available for this restaurant") # website if availible
-        })
-
-    return results[:9] # top 9 results since there was an error with the 10th one for a certain category (was listed as unnamed and had no information)
-
-
-@callback(
-    Output("restaurant-list", "children"), # children since a text/div
+    # the data query part is the above where the requests only looks for restaurants in that vicinity
+    # errors are raised so the catalog can keep the last good data
+    r = httpclient.get(OVERPASS_URL, params={'data': query}, timeout=15) # read timeout 15 seconds, retried with backoff
+    r.raise_for_status()
+    with timed("parse_restaurants"):
+        return r.json()["elements"]  # all the restaurants as a list
+
+
+# restaurants are downloaded once and kept in memory, then downloaded again after the TTL
+CATALOG_TTL = 60 * 60  # one hour in seconds
+
+# threads asking at the same time share one Overpass request, and the answer is shared with
+# the other workers (sharedcache.py) for the same TTL
+def fetch_all_restaurants():
+    return flights.do(
+        "overpass-restaurants",
+        lambda: shared_cache.fetch("overpass-restaurants", CATALOG_TTL, download_all_restaurants),
+    )
+
+
+# restaurants imported from an OSM extract with ingest_osm.py are read from the local store,
+# Overpass is only asked when nothing has been imported
+def load_restaurants():
+    if restaurant_store.exists() and restaurant_store.count():
+        with timed("read_restaurant_store"):
+            return restaurant_store.elements_near(LAT, LON, RADIUS)
+    return fetch_all_restaurants()
+
+
+# every new download makes sure each restaurant has a row in the ratings store,
+# so showing a page only ever reads ratings
+def prepare_ratings(index):
+    ratings.seed_restaurants(r["id"] for r in index.records)
+
+catalog = RestaurantCatalog(load_restaurants, CUISINE_CATEGORIES, ttl=CATALOG_TTL, on_index=prepare_ratings)
+
+
+# function that gets restaurants that match the cuisine filter (answered from the catalog in memory)
+def fetch_restaurants(cuisine_filter):
+    return catalog.lookup(cuisine_filter)
+
+
+# restaurants are sent to the browser one page at a time, so the answer stays the same size
+# no matter how many restaurants match
+PAGE_SIZE = 9
+PAGE_COLUMNS = ["name", "phone", "website", "rating", "reviews", "distance"]
+
+# restaurants of a cuisine with how far (meters) each one is from the point
+# with a radius only the cells of the spatial index around the point are looked at
+def restaurants_near(cuisine, point, radius_m=None):
+    index = catalog.index() # one index for the whole search, even if a new one arrives meanwhile
+    restaurants = index.lookup(cuisine)
+    lat, lon = point
+    if radius_m:
+        distances = {r["id"]: d for d, r in index.geo.within(lat, lon, radius_m)}
+        restaurants = [r for r in restaurants if r["id"] in distances]
+    else:
+        distances = {
+            r["id"]: distance_m(lat, lon, r["lat"], r["lon"]) for r in restaurants if r["lat"] is not None
+        }
+    return restaurants, distances
+
+
+# one page of results as columns (name: [...], phone: [...], ...) instead of a tree of cards
+# offset is the cursor: where the page starts in the full list
+def restaurant_page(cuisine, offset=0, sort="default", near="Historic Area", radius=0):
+    point = NEAR_POINTS.get(near, HISTORIC_AREA)
+    # radius comes from the browser, only the dropdown's values are taken
+    if not isinstance(radius, (int, float)) or radius not in RADIUS_OPTIONS:
+        radius = 0
+    restaurants, distances = restaurants_near(cuisine, point, radius * METERS_PER_MILE)
+    if sort == "rating":
+        restaurants = ratings.sort_by_rating("restaurant", restaurants) # order comes from the ratings index
+    elif sort == "distance":
+        far = float("inf") # restaurants without a location go last
+        restaurants = sorted(restaurants, key=lambda r: distances.get(r["id"], far))
+    total = len(restaurants)
+    offset = max(0, min(offset, max(total - 1, 0)))
+    rows = restaurants[offset:offset + PAGE_SIZE]
+
+    # ratings for the whole page in one lookup
+    page_ratings = ratings.get_many("restaurant", [r["id"] for r in rows])
+    missing = [r["id"] for r in rows if r["id"] not in page_ratings]
+    if missing: # only if the store was cleared after the last download
+        ratings.seed_restaurants(missing)
+        page_ratings.update(ratings.get_many("restaurant", missing))
+
+    columns = {c: [] for c in PAGE_COLUMNS}
+    for r in rows:
+        rating = page_ratings[r["id"]]
+        columns["name"].append(r["name"])
+        columns["phone"].append(r["phone"])
+        columns["website"].append(r["website"])
+        columns["rating"].append(round(rating.average, 1))
+        columns["reviews"].append(rating.count)
+        d = distances.get(r["id"])
+        columns["distance"].append(round(d / METERS_PER_MILE, 1) if d is not None else None)
+
+    return {
+        "query": restaurant_query(cuisine, sort, near, radius),
+        "total": total,
+        "offset": offset,
+        "prev": offset - PAGE_SIZE if offset > 0 else None, # cursor of the previous page
+        "next": offset + PAGE_SIZE if offset + PAGE_SIZE < total else None, # cursor of the next page
+        "columns": columns,
+    }
+
+
+# everything that picks the list of results, the pager only keeps its place within the same query
+def restaurant_query(cuisine, sort, near, radius):
+    return {"cuisine": cuisine, "sort": sort, "near": near, "radius": radius}
+
+
+# can run as a background job (BACKGROUND_CALLBACKS=1, backgroundjobs.py) since the first search may wait on Overpass
+@background_callback(
+    Output("restaurant-page", "data"), # compact page of results, drawn in the browser
     Input("search-btn", "n_clicks"), # n_clicks since it is a button
-    Input("cuisine-dd", "value") # value since it is a dropdown
+    Input("cuisine-dd", "value"), # value since it is a dropdown
+    Input("sort-dd", "value"),
+    Input("near-dd", "value"),
+    Input("radius-dd", "value"),
+    Input("restaurant-cursor", "data"), # set by the previous/next buttons
+    progress=[Output("restaurant-status", "children")],
+    progress_default=[""],
+    running=[(Output("search-btn", "disabled"), True, False)],
 )
 # callback function that updates the restaurant list when the search button is clicked
-def update_restaurants(n_clicks, cuisine): 
-    restaurants = fetch_restaurants(cuisine) # prints the list of restaurants that match the cuisine type
-    if not restaurants:
-        return html.Div("No restaurants found.") # if there are no restaurants that fit the criteria
-    
+def update_restaurants(set_progress, n_clicks, cuisine, sort, near, radius, cursor):
+    if catalog.dataset.snapshot is None:
+        set_progress(["Downloading restaurants, this can take a few seconds..."])
+    # a new search starts at the top, the pager buttons move the cursor
+    offset = 0
+    if (ctx.triggered_id == "restaurant-cursor" and cursor
+            and cursor.get("query") == restaurant_query(cuisine, sort, near, radius)):
+        try:
+            offset = int(cursor.get("offset") or 0) # comes from the browser, restaurant_page clamps it
+        except (TypeError, ValueError):
+            offset = 0
+    return restaurant_page(cuisine, offset, sort, near, radius)
+
+
+# previous/next buttons only move the cursor, no need to ask the server for that
+@clientside_eligible(
+    Output("restaurant-cursor", "data"),
+    Input("restaurant-prev", "n_clicks"),
+    Input("restaurant-next", "n_clicks"),
+    State("restaurant-page", "data"),
+    js="""
+    function (prevClicks, nextClicks, page) {
+        var triggered = dash_clientside.callback_context.triggered_id;
+        var offset = page && (triggered === "restaurant-prev" ? page.prev : page.next);
+        if (offset === null || offset === undefined) {
+            return dash_clientside.no_update;
+        }
+        return {query: page.query, offset: offset};
+    }""",
+    prevent_initial_call=True,
+)
+def move_restaurant_cursor(prev_clicks, next_clicks, page):
+    offset = page and (page["prev"] if ctx.triggered_id == "restaurant-prev" else page["next"])
+    if offset is None:
+        return no_update
+    return {"query": page["query"], "offset": offset}
+
+
+# draws the cards for one page (the browser version is render in assets/restaurants.js)
+@clientside_eligible(
+    Output("restaurant-list", "children"), # children since a text/div
+    Output("restaurant-range", "children"),
+    Output("restaurant-prev", "disabled"),
+    Output("restaurant-next", "disabled"),
+    Input("restaurant-page", "data"),
+    js=ClientsideFunction(namespace="restaurants", function_name="render"),
+)
+def render_restaurant_page(page):
+    if not page or not page["total"]:
+        return html.Div("No restaurants found."), "", True, True # if there are no restaurants that fit the criteria
+
     # prints all the desired information about the restaurant or restaurants
     children = []  # stores the list in here
-    for i, r in enumerate(restaurants):
-        # Generate random reviews for demonstration
-        import random
-        review_count = random.randint(15, 150)
-        rating = round(random.uniform(3.5, 5.0), 1)
-        
+    columns = page["columns"]
+    for i in range(len(columns["name"])):
+        rating = columns["rating"][i]
         # Create star rating display
         stars = "★" * int(rating) + "☆" * (5 - int(rating))
-        
+
         # Create a modern restaurant card
         card_content = [
             html.Div([
                 html.Div([
-                    html.H4(r["name"], className="restaurant-name"),
+                    html.H4(columns["name"][i], className="restaurant-name"),
                     html.Div([
                         html.Span(stars, className="restaurant-rating"),
                         html.Span(f"{rating}/5", className="rating-number"),
-                        html.Span(f"({review_count} reviews)", className="review-count")
+                        html.Span(f"({columns['reviews'][i]} reviews)", className="review-count")
                     ], className="restaurant-rating-container")
                 ], className="restaurant-header"),
                 
                 html.Div([
                     html.Div([
                         html.Span("📞", className="phone-emoji"),
-                        html.Span(r["phone"], className="restaurant-phone")
+                        html.Span(columns["phone"][i], className="restaurant-phone")
                     ], className="restaurant-info-item"),
+                    html.Div([
+                        html.Span("📍", className="phone-emoji"),
+                        html.Span(f"{columns['distance'][i]} mi away", className="restaurant-phone")
+                    ], className="restaurant-info-item") if columns["distance"][i] is not None else None,
                     html.Div([
                         html.A([
                             html.I(className="fas fa-external-link-alt button-icon"),
                             html.Span("Visit Website", className="button-text")
-                        ], href=r["website"], target="_blank", className="website-button")
+                        ], href=columns["website"][i], target="_blank", className="website-button")
                     ], className="restaurant-info-item")
                 ], className="restaurant-info")
             ], className="restaurant-card-content")
         ]
-        
-        children.append(
-            html.Div(
-                card_content,
-                className="restaurant-card",
-                style={"animation-delay": f"{i * 0.1}s"}
-            )
-        )
-    return children
-
-
-@callback(
+        # the slide-in delay per card lives in style.css (nth-child), not in every card
+        children.append(html.Div(card_content, className="restaurant-card"))
+
+    first = page["offset"] + 1
+    last = page["offset"] + len(columns["name"])
+    shown = f"Showing {first}-{last} of {page['total']}"
+    return children, shown, page["prev"] is None, page["next"] is None
+
+
+# picture (and responsive copies) for every cuisine, sent to the browser once with the page
+CUISINE_IMAGE_SOURCES = {cuisine: image_sources(image) for cuisine, image in CUISINE_IMAGES.items()}
+
+# callback function for the image, only a lookup so it runs in the browser
+@clientside_eligible(
     Output("cuisine-img", "src"),
-    Input("cuisine-dd", "value")
+    Output("cuisine-img", "srcSet"),
+    Input("cuisine-dd", "value"),
+    js="""
+    function (cuisine) {
+        var image = tables.images[cuisine] || tables.images["Other"];
+        return [image.src, image.srcSet];
+    }""",
+    tables={"images": CUISINE_IMAGE_SOURCES},
 )
-# callback function for the image
 def update_cuisine_image(cuisine):
-    return f"/assets/{CUISINE_IMAGES.get(cuisine, 'other.jpg')}" # shows the image associated with the type of food
+    image = CUISINE_IMAGE_SOURCES.get(cuisine, CUISINE_IMAGE_SOURCES["Other"]) # shows the image associated with the type of food
+    return image["src"], image["srcSet"]
@@ -1,36 +1,102 @@
 # import necessary packages to plot the weather 
-from dash import html, dcc, callback, Input, Output, register_page
-import requests
-import pandas as pd
-import plotly.express as px
+from dash import html, dcc, no_update, Input, Output, register_page
 from datetime import datetime
+import json
+import os
+import time
 import dash_bootstrap_components as dbc
+from refresher import refresher
+from lrucache import LRUCache
+from singleflight import flights
+from clientside import clientside_eligible
+from metrics import timed, watch_cache
+from backgroundjobs import background_callback
+from sharedcache import shared_cache
+
+# the http client, numpy (forecast) and plotly (weatherchart) are imported inside the functions that use them
+# so a worker that never shows the weather page does not pay for them at startup
 
 # Register Page
 register_page(__name__, path='/weather', name="Weather")
 
 # Williamsburg coordinates
 LAT, LON = 37.2707, -76.7075
+# Open-Meteo endpoint, can be pointed somewhere else (e.g. the load test's stand-in server)
+OPEN_METEO_URL = os.environ.get("OPEN_METEO_URL", "https://api.open-meteo.com/v1/forecast")
 
-# Get hourly temperature
-def fetch_hourly_temp(lat, lon):
+# seconds a downloaded forecast is shared with the other workers (sharedcache.py) before
+# one of them asks Open-Meteo again
+FORECAST_TTL = 15 * 60
+
+# downloads the hourly temperatures as Open-Meteo sends them
+# errors are raised so the refresher can keep serving the last good forecast
+def download_hourly_data(lat, lon):
+    import httpclient
     # api that we use to get the weather 
     url = (
-        "https://api.open-meteo.com/v1/forecast"
+        f"{OPEN_METEO_URL}"
         f"?latitude={lat}&longitude={lon}"
         "&hourly=temperature_2m&forecast_days=2&timezone=auto"
     )
-    try:
-        r = requests.get(url, timeout=15)  # timeout after 15 seconds
-        r.raise_for_status()
-        data = r.json()["hourly"]  # stores temperatures 
-        df = pd.DataFrame({"time": data["time"], "temp_C": data["temperature_2m"]}) 
-        df["time"] = pd.to_datetime(df["time"])
-        # Convert Celsius to Fahrenheit
-        df["temp_F"] = df["temp_C"] * 9/5 + 32
-        return df
-    except requests.RequestException as e:
-        return pd.DataFrame(columns=["time", "temp_F"])  # stores as list with time and temperature
+    r = httpclient.get(url, timeout=15)  # read timeout 15 seconds, retried with backoff
+    r.raise_for_status()
+    return r.json()["hourly"]  # stores temperatures 
+
+# builds the forecast once (Fahrenheit and daily stats included) from the shared copy of the
+# download, only the first worker that needs it actually asks Open-Meteo
+def download_hourly_temp(lat, lon):
+    from forecast import Forecast
+    data = shared_cache.fetch(f"open-meteo:{lat}:{lon}", FORECAST_TTL, lambda: download_hourly_data(lat, lon))
+    with timed("parse_forecast"):
+        return Forecast.from_open_meteo(data)
+
+# parsed forecasts are cached per location and per forecast hour
+# open-meteo updates its models about once an hour, so every visitor in the same hour
+# shares one download; the cache is bounded and drops the least recently used location
+FORECAST_CACHE_SIZE = 32
+forecast_cache = LRUCache(FORECAST_CACHE_SIZE)
+watch_cache("forecast", forecast_cache)
+
+# cache key: lat/lon rounded to ~1 km plus the current (UTC) forecast hour
+def forecast_key(lat, lon):
+    return (round(lat, 2), round(lon, 2), int(time.time() // 3600))
+
+# downloads a forecast into the cache (unless another thread just did)
+# fetch_hourly_temp already counted this lookup as a miss, so it is only peeked at here
+def load_forecast(key):
+    fc = forecast_cache.peek(key)
+    if fc is None:
+        fc = download_hourly_temp(key[0], key[1])
+        forecast_cache.put(key, fc)
+    return fc
+
+# Get hourly temperature (cached, the returned forecast is shared so it must not be changed)
+# on a miss, threads asking for the same location at the same time share one download
+def fetch_hourly_temp(lat, lon):
+    key = forecast_key(lat, lon)
+    fc = forecast_cache.get(key)
+    if fc is None:
+        fc = flights.do(("forecast",) + key, lambda: load_forecast(key))
+    return fc
+
+# the Williamsburg forecast is kept warm in the background, callbacks read the last good copy
+# its chart is drawn right away too, so callbacks (and background jobs forked from this
+# process) find it in the chart cache
+def load_williamsburg_forecast():
+    from weatherchart import figure_json
+    fc = fetch_hourly_temp(LAT, LON)
+    figure_json(fc)
+    return fc
+
+WEATHER_REFRESH = 15 * 60  # seconds between forecast downloads
+forecast = refresher.register(
+    "weather",
+    load_williamsburg_forecast,
+    interval=WEATHER_REFRESH,
+)
+
+# columns of the summary table
+SUMMARY_COLUMNS = ["Date", "Min °F", "Max °F", "Avg °F"]
 
 # Layout
 layout = dbc.Container([
@@ -99,7 +165,10 @@ layout = dbc.Container([
                         ], className="weather-icon-circle stats-icon"),
                         html.Div([
                             html.H3("Summary Stats", className="weather-card-title"),
-                            dcc.Loading(html.Div(id="stats-table", className="weather-stats-table"))
+                            dcc.Loading([
+                                dcc.Store(id="weather-summary"), # summary rows, the table is drawn in the browser
+                                html.Div(id="stats-table", className="weather-stats-table")
+                            ])
                         ], className="weather-card-content")
                     ], className="weather-card-header")
                 ], className="weather-card stats-card")
@@ -113,8 +182,11 @@ layout = dbc.Container([
                     html.I(className="fas fa-chart-line weather-chart-icon"),
                     html.H3("Hourly Temperature Forecast", className="weather-chart-title")
                 ], className="weather-chart-header"),
-                dcc.Loading(
-                    dcc.Graph(id="temp-chart", config={"displayModeBar": False}),
+                html.Div(id="weather-status", className="loading-status"), # progress of a running refresh
+                dcc.Loading([
+                    dcc.Store(id="temp-chart-json"), # serialized figure, cached per forecast version
+                    dcc.Graph(id="temp-chart", config={"displayModeBar": False})
+                ],
                     type="circle",
                     color="#8B4513"
                 )
@@ -123,87 +195,101 @@ layout = dbc.Container([
     ], className="weather-main-content")
 ], fluid=True, className="weather-container")
 
-# Callback
-@callback(
+# Callback (can be a background job, see backgroundjobs.py, since the first one may wait on the weather website)
+@background_callback(
     [
-        Output("temp-chart", "figure"), # graph
+        Output("temp-chart-json", "data"), # graph (already serialized)
         Output("kpi-now", "children"), # weather now
         Output("kpi-min", "children"), # low
         Output("kpi-max", "children"), # high
-        Output("stats-table", "children"), 
+        Output("weather-summary", "data"), # rows for the summary table
     ],
     [Input("refresh-btn", "n_clicks")],
+    progress=[Output("weather-status", "children")],
+    progress_default=[""],
+    running=[(Output("refresh-btn", "disabled"), True, False)],
     prevent_initial_call=False
 )
-def update_weather(n_clicks):
-    df = fetch_hourly_temp(LAT, LON) # function that gets weather
-    
-    if df.empty:
-        empty_fig = px.line()
-        empty_fig.update_layout(
-            title="No weather data available",
-            xaxis_title="Time",
-            yaxis_title="Temperature (°F)"
-        )
-        return empty_fig, "N/A", "N/A", "N/A", html.Div("No weather data available", className="weather-no-data")
-    
-    now = df.iloc[0]["temp_F"] # temp now
-    tmin = df["temp_F"].min() # low
-    tmax = df["temp_F"].max() # high
+def update_weather(set_progress, n_clicks):
+    return weather_outputs(set_progress)
+
+
+# what update_weather answers, the same whether it runs as a job or an ordinary callback
+# set_progress shows a message while the first download is running
+def weather_outputs(set_progress=lambda *values: None):
+    from weatherchart import figure_json
+    if forecast.snapshot is None:
+        set_progress(["Getting the forecast from the weather service..."])
+    fc = forecast.get() # last downloaded forecast, never waits on the weather website once warm
+    chart = figure_json(fc) # styling comes from the chart template, the json is cached per forecast
     
-    fig = px.line(df, x="time", y="temp_F", markers=True) # graph layout
-    fig.update_layout(
-        margin=dict(l=20, r=20, t=20, b=20),
-        plot_bgcolor='rgba(0,0,0,0)',
-        paper_bgcolor='rgba(0,0,0,0)',
-        font=dict(family="'Segoe UI', Tahoma, Geneva, Verdana, sans-serif", size=12),
-        yaxis=dict(
-            title=dict(text="Temperature (°F)", font=dict(size=14, color="#495057")),
-            tickfont=dict(size=12, color="#6c757d"),
-            gridcolor='rgba(0,0,0,0.1)',
-            zeroline=False
-        ),
-        xaxis=dict(
-            title=dict(text="Time", font=dict(size=14, color="#495057")),
-            tickfont=dict(size=12, color="#6c757d"),
-            gridcolor='rgba(0,0,0,0.1)',
-            zeroline=False
-        ),
-        hoverlabel=dict(
-            bgcolor="white",
-            font_size=12,
-            font_family="'Segoe UI', Tahoma, Geneva, Verdana, sans-serif"
-        )
-    )
+    if fc is None or fc.is_empty: # nothing downloaded yet
+        return chart, "N/A", "N/A", "N/A", None
     
-    # Update line styling
-    fig.update_traces(
-        line=dict(color='#8B4513', width=3),
-        marker=dict(color='#A0522D', size=6, line=dict(color='white', width=2)),
-        hovertemplate='<b>%{x}</b><br>Temperature: %{y:.1f}°F<extra></extra>'
-    )
+    now = fc.now() # temp now
+    tmin = fc.min() # low
+    tmax = fc.max() # high
     
-    summary = (
-        df.assign(Date=df["time"].dt.date)
-        .groupby("Date")["temp_F"]
-        .agg(["min", "max", "mean"])
-        .round(1)
-        .rename(columns={"min": "Min °F", "max": "Max °F", "mean": "Avg °F"})
-        .reset_index()
-    )
+    # per-day min/max/mean, already worked out when downloaded
+    # sent as plain rows (a small answer that encodes fast), the table is built in the browser
+    summary = {"columns": SUMMARY_COLUMNS, "rows": fc.summary_rows()}
     
-    table = html.Table([
+    fmt = lambda x: f"{x:.1f}"
+    return chart, fmt(now), fmt(tmin), fmt(tmax), summary  # returns all necessary values
+
+
+# draws the summary table from its rows, in the browser
+@clientside_eligible(
+    Output("stats-table", "children"),
+    Input("weather-summary", "data"),
+    js="""
+    function (summary) {
+        function el(type, props, children) {
+            props.children = children;
+            return {type: type, namespace: "dash_html_components", props: props};
+        }
+        if (!summary) {
+            return el("Div", {className: "weather-no-data"}, "No weather data available");
+        }
+        return el("Table", {className: "weather-table"}, [
+            el("Thead", {className: "weather-table-head"}, [
+                el("Tr", {}, summary.columns.map(function (c) {
+                    return el("Th", {className: "weather-table-header"}, c);
+                }))
+            ]),
+            el("Tbody", {className: "weather-table-body"}, summary.rows.map(function (row) {
+                return el("Tr", {className: "weather-table-row"}, row.map(function (v) {
+                    return el("Td", {className: "weather-table-cell"}, v);
+                }));
+            }))
+        ]);
+    }""",
+)
+def draw_summary_table(summary):
+    if not summary:
+        return html.Div("No weather data available", className="weather-no-data")
+    return html.Table([
         html.Thead([
             html.Tr([
-                html.Th(c, className="weather-table-header") for c in summary.columns
+                html.Th(c, className="weather-table-header") for c in summary["columns"]
             ])
         ], className="weather-table-head"),
         html.Tbody([
             html.Tr([
                 html.Td(v, className="weather-table-cell") for v in row
-            ], className="weather-table-row") for row in summary.values
+            ], className="weather-table-row") for row in summary["rows"]
         ], className="weather-table-body")
     ], className="weather-table")
-    
-    fmt = lambda x: f"{x:.1f}"
-    return fig, fmt(now), fmt(tmin), fmt(tmax), table  # returns all necessary values
+
+
+# turns the cached json back into the figure, in the browser
+@clientside_eligible(
+    Output("temp-chart", "figure"),
+    Input("temp-chart-json", "data"),
+    js="""
+    function (body) {
+        return body ? JSON.parse(body) : dash_clientside.no_update;
+    }""",
+)
+def draw_temperature_chart(body):
+    return json.loads(body) if body else no_update
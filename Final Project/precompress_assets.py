@@ -0,0 +1,45 @@
+# build step: writes gzip (and brotli, if the brotli package is installed) copies of the
+# text files in assets/ into build/compressed/, named after their fingerprinted path
+# so the server can send them without compressing anything at request time
+#
+# run from the "Final Project" folder after changing anything in assets/:
+#   python precompress_assets.py
+import gzip
+import os
+
+import staticassets
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip alone still works
+    brotli = None
+
+
+def write(path, body):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(body)
+
+
+def main():
+    written = 0
+    for asset in staticassets.load().values():
+        if not asset.path.endswith(staticassets.COMPRESSIBLE):
+            continue
+        target = os.path.join(staticassets.COMPRESSED_DIR, asset.hashed_path)
+        if os.path.exists(target + ".gz"):
+            continue # same hash, same content, already compressed
+        gz = gzip.compress(asset.body, compresslevel=9, mtime=0)
+        write(target + ".gz", gz)
+        line = f"{asset.path}: {len(asset.body) // 1024} KB -> gzip {len(gz) // 1024} KB"
+        if brotli is not None:
+            br = brotli.compress(asset.body, quality=11)
+            write(target + ".br", br)
+            line += f", brotli {len(br) // 1024} KB"
+        print(line)
+        written += 1
+    print(f"{written} files compressed into {staticassets.COMPRESSED_DIR}")
+
+
+if __name__ == "__main__":
+    main()
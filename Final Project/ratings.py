@@ -0,0 +1,154 @@
+# ratings and review counts kept in a small sqlite database
+# restaurants are stored by their osm id (e.g. node/123) and attractions by name, each
+# with the average, the number of reviews and how many 1-5 star reviews there are.
+# a whole page of results is looked up in one query, and the index on the average
+# gives the "top rated" order without sorting in python
+import os
+import random
+import threading
+
+from forkguard import sqlite_call
+from sqliteconnections import SqliteConnections
+
+DB_PATH = os.environ.get(
+    "RATINGS_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "ratings.db"),
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ratings (
+    kind TEXT NOT NULL,            -- 'restaurant' or 'attraction'
+    subject_id TEXT NOT NULL,      -- osm id for restaurants, name for attractions
+    average REAL NOT NULL,         -- 1-5 stars for restaurants, 0-100 for attractions
+    count INTEGER NOT NULL,
+    hist1 INTEGER NOT NULL DEFAULT 0,
+    hist2 INTEGER NOT NULL DEFAULT 0,
+    hist3 INTEGER NOT NULL DEFAULT 0,
+    hist4 INTEGER NOT NULL DEFAULT 0,
+    hist5 INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (kind, subject_id)
+);
+CREATE INDEX IF NOT EXISTS ratings_by_average ON ratings (kind, average DESC, count DESC);
+"""
+
+MAX_VARIABLES = 900  # stay under sqlite's limit of ? placeholders per query
+
+
+class Rating:
+    def __init__(self, average, count, histogram):
+        self.average = average
+        self.count = count
+        self.histogram = histogram # [1 star, 2 stars, ..., 5 stars]
+
+
+# made-up but stable reviews for a restaurant we have no reviews for yet:
+# seeded by its osm id, so it gets the same numbers every time (and on every worker)
+def demo_histogram(subject_id):
+    rng = random.Random(subject_id)
+    count = rng.randint(15, 150)
+    # mostly 4 and 5 star reviews, like the old random 3.5-5.0 ratings
+    weights = [0.02, 0.03, rng.uniform(0.03, 0.2), rng.uniform(0.2, 0.45), rng.uniform(0.3, 0.7)]
+    histogram = [0] * 5
+    for stars in rng.choices(range(5), weights=weights, k=count):
+        histogram[stars] += 1
+    return histogram
+
+
+def average_of(histogram):
+    count = sum(histogram)
+    if not count:
+        return 0.0, 0
+    return sum((stars + 1) * n for stars, n in enumerate(histogram)) / count, count
+
+
+class RatingsStore:
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self.version = 0 # goes up whenever ratings are added, used to refresh the cached order
+        self._ranking = {}
+        self.connections = SqliteConnections(path, SCHEMA)
+        self._lock = threading.Lock()
+        os.register_at_fork(after_in_child=self.after_fork)
+
+    def after_fork(self):
+        self._lock = threading.Lock()
+
+    def connection(self):
+        return self.connections.get()
+
+    # adds ratings for subjects that are not in the store yet (existing ones are kept)
+    @sqlite_call
+    def add_missing(self, kind, rows):
+        rows = list(rows)
+        if not rows:
+            return 0
+        conn = self.connection()
+        with self._lock, conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO ratings (kind, subject_id, average, count, hist1, hist2, hist3, hist4, hist5) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(kind, subject_id, average, count, *histogram) for subject_id, average, count, histogram in rows],
+            )
+            added = conn.total_changes - before
+            if added:
+                self.version += 1
+        return added
+
+    def seed_restaurants(self, osm_ids):
+        rows = []
+        for osm_id in osm_ids:
+            histogram = demo_histogram(osm_id)
+            average, count = average_of(histogram)
+            rows.append((osm_id, average, count, histogram))
+        return self.add_missing("restaurant", rows)
+
+    # attraction ratings come from the 0-100 scores we already have
+    def seed_attractions(self, attractions):
+        return self.add_missing("attraction", [(a["name"], a["rating"], 0, [0] * 5) for a in attractions])
+
+    # ratings for a whole page of subjects in one query: {subject_id: Rating}
+    @sqlite_call
+    def get_many(self, kind, subject_ids):
+        subject_ids = list(dict.fromkeys(subject_ids))
+        found = {}
+        conn = self.connection()
+        for start in range(0, len(subject_ids), MAX_VARIABLES):
+            chunk = subject_ids[start:start + MAX_VARIABLES]
+            marks = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                "SELECT subject_id, average, count, hist1, hist2, hist3, hist4, hist5 FROM ratings "
+                f"WHERE kind = ? AND subject_id IN ({marks})",
+                [kind, *chunk],
+            )
+            for subject_id, average, count, *histogram in rows:
+                found[subject_id] = Rating(average, count, histogram)
+        return found
+
+    def get(self, kind, subject_id):
+        return self.get_many(kind, [subject_id]).get(subject_id)
+
+    # every subject of a kind from best to worst rated, read straight from the index
+    # cached as {subject_id: position} until new ratings are added
+    @sqlite_call
+    def ranking(self, kind):
+        cached = self._ranking.get(kind)
+        if cached is not None and cached[0] == self.version:
+            return cached[1]
+        version = self.version
+        rows = self.connection().execute(
+            "SELECT subject_id FROM ratings WHERE kind = ? ORDER BY average DESC, count DESC", (kind,)
+        )
+        positions = {subject_id: i for i, (subject_id,) in enumerate(rows)}
+        self._ranking[kind] = (version, positions)
+        return positions
+
+    # sorts records (dicts with an "id") best rated first, unrated ones keep their order at the end
+    def sort_by_rating(self, kind, records, key="id"):
+        positions = self.ranking(kind)
+        last = len(positions)
+        return sorted(records, key=lambda r: positions.get(r[key], last))
+
+
+# shared by every page
+store = RatingsStore()
@@ -0,0 +1,147 @@
+# background refresher for the data that comes from other websites
+# every dataset keeps its last good snapshot, callbacks read that snapshot right away
+# and a background thread downloads a new one on the dataset's own interval
+import os
+import threading
+import time
+
+TICK = 1  # how often (seconds) the scheduler checks which datasets are due
+RETRY_DELAY = 60  # wait this long (seconds) before trying again after a failed refresh
+FIRST_LOAD_WAIT = 20  # seconds a callback waits for a first download that another thread started
+
+
+class Dataset:
+    def __init__(self, name, loader, interval, default=None):
+        self.name = name
+        self.loader = loader # function that downloads and returns a new snapshot
+        self.interval = interval # seconds between refreshes
+        self.default = default # what callbacks get if nothing was ever downloaded
+        self.snapshot = None
+        self.loaded_at = None
+        self.last_error = None
+        self.attempted_at = None
+        self.next_attempt = 0.0
+        self._lock = threading.Lock() # only one refresh of a dataset runs at a time
+        os.register_at_fork(after_in_child=self.after_fork)
+
+    # the refresh running in the parent (if any) does not run in a forked process
+    def after_fork(self):
+        self._lock = threading.Lock()
+
+    def age(self):
+        if self.loaded_at is None:
+            return None
+        return time.monotonic() - self.loaded_at
+
+    def is_due(self):
+        return time.monotonic() >= self.next_attempt
+
+    def is_refreshing(self):
+        return self._lock.locked()
+
+    # wait: True to wait for a refresh that is already running, False not to, or a number of seconds
+    def refresh(self, wait=True):
+        started = time.monotonic()
+        timeout = -1 if wait is True else (0 if wait is False else wait)
+        if not self._lock.acquire(timeout=timeout):
+            return False # somebody else is already refreshing
+        try:
+            # another thread finished a refresh while we were waiting, use its outcome
+            # instead of asking the website again (also when it failed)
+            if self.attempted_at is not None and self.attempted_at >= started:
+                return self.last_error is None
+            try:
+                snapshot = self.loader()
+            except Exception as e:
+                self.attempted_at = time.monotonic()
+                # keep serving the last good snapshot and try again a bit later
+                self.last_error = f"{type(e).__name__}: {e}"
+                self.next_attempt = time.monotonic() + min(self.interval, RETRY_DELAY)
+                return False
+            self.snapshot = snapshot
+            self.loaded_at = self.attempted_at = time.monotonic()
+            self.last_error = None
+            self.next_attempt = self.loaded_at + self.interval
+            return True
+        finally:
+            self._lock.release()
+
+    def refresh_in_background(self):
+        if self.is_refreshing():
+            return
+        threading.Thread(target=self.refresh, kwargs={"wait": False}, name=f"refresh-{self.name}", daemon=True).start()
+
+    def get(self):
+        if self.snapshot is None:
+            # nothing downloaded yet, this is the only time a callback waits for the website
+            # (and not for ever: if the website is slow the callback gives up and shows the default)
+            self.refresh(wait=FIRST_LOAD_WAIT)
+            return self.snapshot if self.snapshot is not None else self.default
+        if self.is_due():
+            # stale, hand back what we have and download a new one in the background
+            self.refresh_in_background()
+        return self.snapshot
+
+
+class Refresher:
+    def __init__(self):
+        self.datasets = {}
+        self._thread = None
+
+    def register(self, name, loader, interval, default=None):
+        dataset = Dataset(name, loader, interval, default)
+        self.datasets[name] = dataset
+        return dataset
+
+    def get(self, name):
+        return self.datasets[name].get()
+
+    # downloads every dataset once, all at the same time, and waits (at most timeout seconds)
+    # returns {name: True if it loaded}; used before the server starts taking requests
+    def warm(self, timeout=None):
+        threads = [
+            threading.Thread(target=d.refresh, name=f"warm-{d.name}", daemon=True)
+            for d in self.datasets.values() if d.snapshot is None
+        ]
+        for t in threads:
+            t.start()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for t in threads:
+            t.join(None if deadline is None else max(0, deadline - time.monotonic()))
+        return {name: d.snapshot is not None for name, d in self.datasets.items()}
+
+    # true once every dataset has been tried at least once (loaded, or failed and on its default)
+    def ready(self):
+        return all(d.attempted_at is not None for d in self.datasets.values())
+
+    def ages(self):
+        # age in seconds of every dataset (None if it was never downloaded)
+        return {name: d.age() for name, d in self.datasets.items()}
+
+    def status(self):
+        return {
+            name: {
+                "age": d.age(),
+                "interval": d.interval,
+                "refreshing": d.is_refreshing(),
+                "last_error": d.last_error,
+            }
+            for name, d in self.datasets.items()
+        }
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="refresher", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            for dataset in list(self.datasets.values()):
+                if dataset.is_due():
+                    dataset.refresh_in_background()
+            time.sleep(TICK)
+
+
+# one refresher shared by every page
+refresher = Refresher()
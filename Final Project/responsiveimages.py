@@ -0,0 +1,36 @@
+# builds responsive <img> properties from the manifest written by build_images.py
+# if the build step was not run the original picture is used, same as before
+import json
+import os
+
+from staticassets import asset_url
+
+MANIFEST = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "variants", "manifest.json")
+
+_manifest = None
+
+
+def load_manifest():
+    global _manifest
+    if _manifest is None:
+        try:
+            with open(MANIFEST) as f:
+                _manifest = json.load(f)
+        except (OSError, ValueError):
+            _manifest = {}
+    return _manifest
+
+
+# src/srcSet for an image in assets/, srcSet lists the webp copies so the browser
+# downloads the smallest one that fits, src is a mid-size jpeg for older browsers
+def image_sources(name, fallback_width=640):
+    entry = load_manifest().get(name)
+    if not entry:
+        return {"src": asset_url(name), "srcSet": None}
+    webp = [v for v in entry["variants"] if v["format"] == "webp"]
+    jpgs = [v for v in entry["variants"] if v["format"] == "jpg"]
+    src = min(jpgs, key=lambda v: abs(v["width"] - fallback_width))
+    return {
+        "src": asset_url(src["file"]),
+        "srcSet": ", ".join(f"{asset_url(v['file'])} {v['width']}w" for v in webp),
+    }
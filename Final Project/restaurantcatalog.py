@@ -0,0 +1,85 @@
+# in-memory restaurant catalog
+# the whole restaurant dataset is downloaded once and split into an inverted index
+# (cuisine -> restaurants) so switching cuisines is a dictionary lookup instead of a new query
+from geoindex import GeoIndex
+from metrics import timed
+from refresher import refresher
+
+
+# turns one raw Overpass element into the record the restaurant page shows
+def make_record(element):
+    tags = element.get("tags", {})
+    # nodes carry lat/lon directly, ways and relations carry a "center" (from "out center")
+    point = element if "lat" in element else element.get("center", {})
+    return {
+        "id": f"{element.get('type', 'node')}/{element.get('id')}", # osm id, e.g. node/123
+        "name": tags.get("name", "Unnamed"), # name of restaurant
+        "phone": tags.get("phone", "Please refer to the website for a phone number."), # phone number if availible
+        "website": tags.get("website", "There is no website available for this restaurant"), # website if availible
+        "cuisines": [c.strip() for c in tags.get("cuisine", "").lower().split(";") if c.strip()], # same format for all cuisines
+        "lat": point.get("lat"),
+        "lon": point.get("lon"),
+    }
+
+
+# the index itself, built once per download and never changed afterwards
+# so it can be read from many callback threads without locking
+class RestaurantIndex:
+    def __init__(self, elements, categories):
+        self.records = [make_record(e) for e in elements]
+
+        # raw cuisine tag -> records (e.g. "pizza" -> [...])
+        self.by_cuisine = {}
+        for record in self.records:
+            for cuisine in record["cuisines"]:
+                self.by_cuisine.setdefault(cuisine, []).append(record)
+
+        # category from the dropdown -> records, keeping the upstream order and no duplicates
+        # an empty list of cuisines means no filtering (same as the old "Other" behaviour)
+        self.by_category = {}
+        for category, cuisines in categories.items():
+            if not cuisines:
+                self.by_category[category] = self.records
+                continue
+            wanted = set(cuisines)
+            self.by_category[category] = [
+                r for r in self.records if wanted.intersection(r["cuisines"])
+            ]
+
+        # where every restaurant is, for "near this place" searches
+        self.geo = GeoIndex((r["lat"], r["lon"], r) for r in self.records)
+
+    def lookup(self, key):
+        # dropdown categories first, then raw cuisine tags ("sushi", "burger", ...)
+        if key in self.by_category:
+            return self.by_category[key]
+        return self.by_cuisine.get(str(key).lower(), [])
+
+
+# keeps the current index warm through the background refresher
+# lookups never wait for Overpass once the first download is done, a stale index is
+# served while the refresher downloads a new one every TTL seconds
+class RestaurantCatalog:
+    def __init__(self, loader, categories, ttl, name="restaurants", on_index=None):
+        self.loader = loader # function that returns the raw Overpass elements
+        self.categories = categories
+        self.ttl = ttl # seconds before the data is downloaded again
+        self.on_index = on_index # called with every new index (in the background), e.g. to prepare ratings
+        self.dataset = refresher.register(name, self.build_index, interval=ttl, default=RestaurantIndex([], categories))
+
+    def build_index(self):
+        elements = self.loader()
+        with timed("build_restaurant_index"):
+            index = RestaurantIndex(elements, self.categories)
+        if self.on_index is not None:
+            self.on_index(index)
+        return index
+
+    def age(self):
+        return self.dataset.age()
+
+    def index(self):
+        return self.dataset.get()
+
+    def lookup(self, key):
+        return self.index().lookup(key)
@@ -0,0 +1,95 @@
+# local copy of the restaurants from OpenStreetMap extracts, filled by ingest_osm.py
+# one row per restaurant (osm id, name, phone, website, cuisine tag and location) in a
+# small sqlite database with an index on the location, so the restaurants page can ask
+# for "everything around Williamsburg" without going to the Overpass API
+import math
+import os
+
+from forkguard import sqlite_call
+from sqliteconnections import SqliteConnections
+from geoindex import METERS_PER_DEGREE, distance_m
+
+DB_PATH = os.environ.get(
+    "RESTAURANTS_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "restaurants.db"),
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS restaurants (
+    osm_id TEXT PRIMARY KEY,       -- node/123, way/456, relation/789
+    version INTEGER,               -- osm version, if the extract has one
+    name TEXT,
+    phone TEXT,
+    website TEXT,
+    cuisine TEXT,                  -- raw tag, e.g. "pizza;italian"
+    lat REAL,
+    lon REAL,
+    source TEXT NOT NULL,          -- extract file it came from
+    run INTEGER NOT NULL           -- ingest run that last saw it
+);
+CREATE INDEX IF NOT EXISTS restaurants_by_location ON restaurants (lat, lon);
+
+-- one row per extract: how far the last ingest got, so it can be resumed
+CREATE TABLE IF NOT EXISTS ingest_runs (
+    source TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    run INTEGER NOT NULL,
+    pass INTEGER NOT NULL,
+    position INTEGER NOT NULL,     -- elements already read in this pass
+    done INTEGER NOT NULL DEFAULT 0
+);
+
+-- ways and relations waiting for the coordinates of their members
+CREATE TABLE IF NOT EXISTS ingest_pending (
+    osm_id TEXT PRIMARY KEY,
+    version INTEGER,
+    tags TEXT NOT NULL,            -- json
+    members TEXT NOT NULL          -- json list of member osm ids
+);
+CREATE TABLE IF NOT EXISTS ingest_nodes (id INTEGER PRIMARY KEY, lat REAL, lon REAL);
+CREATE TABLE IF NOT EXISTS ingest_ways (id INTEGER PRIMARY KEY, nodes TEXT NOT NULL);
+"""
+
+TAGS = ("name", "phone", "website", "cuisine")
+
+
+class RestaurantStore:
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self.connections = SqliteConnections(path, SCHEMA)
+
+    def connection(self):
+        return self.connections.get()
+
+    def exists(self):
+        return self.path == ":memory:" or os.path.exists(self.path)
+
+    @sqlite_call
+    def count(self):
+        return self.connection().execute("SELECT COUNT(*) FROM restaurants").fetchone()[0]
+
+    # restaurants within radius meters of a point, in the same shape as Overpass elements
+    # (type, id, lat, lon, tags) so the catalog can index them like a download
+    @sqlite_call
+    def elements_near(self, lat, lon, radius):
+        dlat = radius / METERS_PER_DEGREE
+        dlon = dlat / max(0.01, math.cos(math.radians(lat)))
+        rows = self.connection().execute(
+            "SELECT osm_id, name, phone, website, cuisine, lat, lon FROM restaurants "
+            "WHERE lat BETWEEN ? AND ? AND lon BETWEEN ? AND ? ORDER BY osm_id",
+            (lat - dlat, lat + dlat, lon - dlon, lon + dlon),
+        )
+        elements = []
+        for osm_id, *values, r_lat, r_lon in rows:
+            if distance_m(lat, lon, r_lat, r_lon) > radius:
+                continue # the box corners are further away than the radius
+            kind, _, number = osm_id.partition("/")
+            tags = {k: v for k, v in zip(TAGS, values) if v is not None}
+            tags["amenity"] = "restaurant"
+            elements.append({"type": kind, "id": int(number), "lat": r_lat, "lon": r_lon, "tags": tags})
+        return elements
+
+
+# the store the restaurants page reads
+store = RestaurantStore()
@@ -0,0 +1,221 @@
+# cache for what the upstream apis answered, shared by every worker process on the host
+# and kept across restarts, so a new worker (or a deploy) reads the last download from
+# disk instead of asking Overpass, Open-Meteo and visitwilliamsburg.com again.
+# every entry has its own expiry. an expired entry is kept for a while longer, so its
+# validators (etag) can be sent back.
+# values are stored with msgpack when it is installed (smaller and faster), json otherwise.
+#
+# backends (SHARED_CACHE):
+#   sqlite  one small sqlite file (WAL, read through a memory map) in data/, the default
+#   memory  a dict in this process, shared by nobody (tests, or a read-only filesystem)
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+
+from forkguard import sqlite_call
+from metrics import watch_cache
+from sqliteconnections import SqliteConnections
+
+try:
+    import msgpack
+except ImportError:  # optional, pip install msgpack
+    msgpack = None
+
+BACKEND = os.environ.get("SHARED_CACHE", "sqlite")
+DB_PATH = os.environ.get(
+    "SHARED_CACHE_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "cache.db"),
+)
+KEEP_EXPIRED = 24 * 60 * 60  # seconds an expired entry is kept for its validators
+LEASE = 30  # seconds one process may take to refill an entry before another one tries
+LEASE_POLL = 0.1  # seconds between two looks for an entry another process is refilling
+MMAP_SIZE = 64 * 1024 * 1024  # bytes of the cache file read through a memory map
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    codec TEXT NOT NULL,           -- 'msgpack' or 'json'
+    value BLOB NOT NULL,
+    expires REAL NOT NULL          -- unix time
+);
+CREATE INDEX IF NOT EXISTS entries_by_expiry ON entries (expires);
+CREATE TABLE IF NOT EXISTS leases (
+    key TEXT PRIMARY KEY,
+    pid INTEGER NOT NULL,
+    until REAL NOT NULL            -- unix time
+);
+"""
+
+# value and expiry of an entry, fresh is False once it expired
+Entry = namedtuple("Entry", "value expires fresh")
+
+
+def encode(value):
+    if msgpack is not None:
+        return "msgpack", msgpack.packb(value, use_bin_type=True)
+    return "json", json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+# None when the entry was written with a codec this process doesn't have
+def decode(codec, data):
+    if codec == "msgpack":
+        return msgpack.unpackb(data, raw=False) if msgpack is not None else None
+    if codec == "json":
+        return json.loads(data)
+    return None
+
+
+class SQLiteBackend:
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self.connections = SqliteConnections(
+            path,
+            SCHEMA,
+            pragmas=(
+                "PRAGMA synchronous=NORMAL", # a lost entry is only a cache miss
+                f"PRAGMA mmap_size={MMAP_SIZE}",
+            ),
+            isolation_level=None, # autocommit
+        )
+
+    def connection(self):
+        return self.connections.get()
+
+    @sqlite_call
+    def get(self, key):
+        row = self.connection().execute(
+            "SELECT codec, value, expires FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        return row # (codec, data, expires) or None
+
+    @sqlite_call
+    def set(self, key, codec, data, expires):
+        conn = self.connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (key, codec, value, expires) VALUES (?, ?, ?, ?)",
+            (key, codec, data, expires),
+        )
+        conn.execute("DELETE FROM entries WHERE expires < ?", (time.time() - KEEP_EXPIRED,))
+
+    @sqlite_call
+    def delete(self, key):
+        self.connection().execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    # true when this process may refill key, other processes wait for it (at most seconds)
+    @sqlite_call
+    def acquire_lease(self, key, seconds):
+        now = time.time()
+        conn = self.connection()
+        conn.execute("DELETE FROM leases WHERE key = ? AND until < ?", (key, now))
+        cur = conn.execute(
+            "INSERT OR IGNORE INTO leases (key, pid, until) VALUES (?, ?, ?)", (key, os.getpid(), now + seconds)
+        )
+        return cur.rowcount == 1
+
+    @sqlite_call
+    def release_lease(self, key):
+        self.connection().execute("DELETE FROM leases WHERE key = ? AND pid = ?", (key, os.getpid()))
+
+
+class MemoryBackend:
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+        os.register_at_fork(after_in_child=self.after_fork)
+
+    def after_fork(self):
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self._data.get(key)
+
+    def set(self, key, codec, data, expires):
+        with self._lock:
+            self._data[key] = (codec, data, expires)
+            cutoff = time.time() - KEEP_EXPIRED
+            for old in [k for k, (_, _, e) in self._data.items() if e < cutoff]:
+                del self._data[old]
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    # nobody else reads this cache, the threads of this process share downloads through singleflight
+    def acquire_lease(self, key, seconds):
+        return True
+
+    def release_lease(self, key):
+        pass
+
+
+class SharedCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    # the entry for key, also when it expired (None if there is none)
+    def entry(self, key):
+        row = self.backend.get(key)
+        if row is None:
+            return None
+        codec, data, expires = row
+        value = decode(codec, data)
+        if value is None:
+            return None
+        return Entry(value, expires, expires > time.time())
+
+    # the value of key if it has not expired yet, else None
+    def get(self, key):
+        entry = self.entry(key)
+        if entry is None or not entry.fresh:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry.value
+
+    # ttl in seconds, value must be made of dicts, lists, strings and numbers
+    def set(self, key, value, ttl):
+        codec, data = encode(value)
+        self.backend.set(key, codec, data, time.time() + ttl)
+
+    def delete(self, key):
+        self.backend.delete(key)
+
+    # the cached value of key, or fetch() stored for ttl seconds. when another process is
+    # already fetching the same key this one waits for its answer instead of asking too.
+    # if fetch fails the error is raised, so the refresher keeps its last snapshot and
+    # reports the failure (an expired value would look like a fresh download)
+    def fetch(self, key, ttl, fetch):
+        value = self.get(key)
+        if value is not None:
+            return value
+        deadline = time.monotonic() + LEASE
+        while not self.backend.acquire_lease(key, LEASE):
+            if time.monotonic() >= deadline:
+                break # the other process is stuck, fetch it ourselves
+            time.sleep(LEASE_POLL)
+            entry = self.entry(key)
+            if entry is not None and entry.fresh:
+                return entry.value
+        try:
+            value = fetch()
+            self.set(key, value, ttl) # before the lease goes, so nobody waiting fetches again
+            return value
+        finally:
+            self.backend.release_lease(key)
+
+
+def make_backend(name=BACKEND):
+    if name == "memory":
+        return MemoryBackend()
+    if name == "sqlite":
+        return SQLiteBackend()
+    raise ValueError(f"unknown SHARED_CACHE backend {name!r} (sqlite or memory)")
+
+
+# the cache every page fetches through
+shared_cache = SharedCache(make_backend())
+watch_cache("shared", shared_cache)
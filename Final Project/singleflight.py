@@ -0,0 +1,63 @@
+# single-flight: when several threads ask for the same thing at the same time,
+# only the first one actually downloads it and the others wait for its result
+import os
+import threading
+
+from metrics import watch_cache
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self.calls = 0 # how many times fn actually ran
+        self.shared = 0 # how many callers got somebody else's result
+        self._inflight = {}
+        self._lock = threading.Lock()
+        os.register_at_fork(after_in_child=self.after_fork)
+
+    # the leaders of the calls in flight are threads that a forked process doesn't have
+    def after_fork(self):
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+                self.calls += 1
+            else:
+                call.waiters += 1
+                self.shared += 1
+
+        if not leader:
+            # someone else is already fetching this key, wait for their answer
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            call.done.set()
+
+
+# shared by every fetch function in this process
+flights = SingleFlight()
+# a shared call counts as a hit, a call that had to run fn as a miss
+watch_cache("singleflight", lambda: (flights.shared, flights.calls))
@@ -0,0 +1,41 @@
+# one sqlite connection per thread for a database file, used by the stores (ratings,
+# restaurants, shared cache). sqlite connections can't be shared between threads, and a
+# forked process opens its own: the parent's can't be used from there (forkguard.py)
+import os
+import sqlite3
+import threading
+
+from forkguard import ConnectionCloser
+
+
+class SqliteConnections:
+    # schema is run on every new connection (CREATE ... IF NOT EXISTS), pragmas are
+    # statements for each new connection after the switch to WAL, isolation_level is
+    # sqlite3's (None for autocommit)
+    def __init__(self, path, schema, pragmas=(), isolation_level=""):
+        self.path = path
+        self.schema = schema
+        self.pragmas = pragmas
+        self.isolation_level = isolation_level
+        self._local = threading.local()
+        os.register_at_fork(after_in_child=self.after_fork)
+
+    def after_fork(self):
+        self._local = threading.local()
+
+    # this thread's connection, opened on first use
+    def get(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=self.isolation_level)
+            # only the first process switches the file to WAL, the others would wait on it
+            if conn.execute("PRAGMA journal_mode").fetchone()[0] != "wal":
+                conn.execute("PRAGMA journal_mode=WAL")
+            for pragma in self.pragmas:
+                conn.execute(pragma)
+            conn.executescript(self.schema)
+            self._local.conn = conn
+            self._local.closer = ConnectionCloser(conn) # closed under the fork guard when the thread ends
+        return conn
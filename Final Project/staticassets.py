@@ -0,0 +1,159 @@
+# fingerprinted static files
+# every file in assets/ gets a url that contains a hash of its content
+# (style.css -> /_assets/style.1a2b3c4d5e.css), so browsers can cache it forever:
+# when the file changes the url changes too. text files are served gzip/brotli
+# compressed from the copies made ahead of time by precompress_assets.py
+import hashlib
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+import flask
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+ASSETS_DIR = os.path.join(APP_DIR, "assets")
+COMPRESSED_DIR = os.path.join(APP_DIR, "build", "compressed")
+URL_PREFIX = "/_assets/"
+MAX_AGE = 365 * 24 * 60 * 60  # one year, the url changes whenever the file does
+HASH_LENGTH = 10
+
+# text types worth compressing (images are already compressed)
+COMPRESSIBLE = (".css", ".js", ".json", ".svg", ".txt", ".html")
+# Content-Encoding -> file suffix, best first
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+CSS_URL = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+
+
+class Asset:
+    def __init__(self, path, hashed_path, body, digest):
+        self.path = path # path inside assets/, e.g. "variants/dewitt-320.webp"
+        self.hashed_path = hashed_path # same path with the hash, e.g. "variants/dewitt-320.ab12cd34ef.webp"
+        self.body = body
+        self.etag = digest
+        self.mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self.compressed = {} # encoding -> precompressed body, read from disk on first use
+
+    @property
+    def url(self):
+        return URL_PREFIX + quote(self.hashed_path)
+
+
+def hashed_name(path, digest):
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.{digest[:HASH_LENGTH]}{ext}"
+
+
+# points the url(...) references inside a stylesheet at the fingerprinted files,
+# so changing an image also changes the hash of the css that uses it
+def rewrite_css(path, text, assets):
+    base = os.path.dirname(path)
+
+    def replace(match):
+        target = match.group(2).strip()
+        if target.startswith(("data:", "http:", "https:", "//", "#")):
+            return match.group(0)
+        if target.startswith("/assets/"):
+            logical = target[len("/assets/"):]
+        else:
+            logical = os.path.normpath(os.path.join(base, target)).replace(os.sep, "/")
+        asset = assets.get(logical)
+        return f"url('{asset.url}')" if asset else match.group(0)
+
+    return CSS_URL.sub(replace, text)
+
+
+# reads assets/ and fingerprints every file (stylesheets last, after what they point to)
+def scan(assets_dir=ASSETS_DIR):
+    paths = []
+    for current, _, files in sorted(os.walk(assets_dir)):
+        for f in sorted(files):
+            full = os.path.join(current, f)
+            paths.append(os.path.relpath(full, assets_dir).replace(os.sep, "/"))
+    paths.sort(key=lambda p: p.endswith(".css"))
+
+    assets = {}
+    for path in paths:
+        with open(os.path.join(assets_dir, path), "rb") as f:
+            body = f.read()
+        if path.endswith(".css"):
+            body = rewrite_css(path, body.decode("utf-8"), assets).encode("utf-8")
+        digest = hashlib.sha256(body).hexdigest()
+        assets[path] = Asset(path, hashed_name(path, digest), body, digest)
+    return assets
+
+
+_assets = None
+_by_hashed = None
+
+
+def load():
+    global _assets, _by_hashed
+    if _assets is None:
+        _assets = scan()
+        _by_hashed = {a.hashed_path: a for a in _assets.values()}
+    return _assets
+
+
+# fingerprinted url of a file in assets/ (falls back to the plain dash url)
+def asset_url(path):
+    asset = load().get(path)
+    return asset.url if asset else f"/assets/{path}"
+
+
+# <link>/<script> tags for every stylesheet and script in assets/, in the same order dash uses
+def css_tags():
+    return "\n".join(
+        f'<link rel="stylesheet" href="{a.url}">' for a in load().values() if a.path.endswith(".css")
+    )
+
+
+def script_tags():
+    return "\n".join(
+        f'<script src="{a.url}"></script>' for a in load().values() if a.path.endswith(".js")
+    )
+
+
+# picks the best precompressed copy the browser accepts, returns (encoding, body)
+# accept_encodings is the parsed header (request.accept_encodings), so "gzip;q=0" is a no
+def compressed_body(asset, accept_encodings):
+    if not asset.path.endswith(COMPRESSIBLE):
+        return None, asset.body
+    for encoding, suffix in ENCODINGS:
+        if not accept_encodings[encoding]:
+            continue
+        body = asset.compressed.get(encoding)
+        if body is None:
+            compressed = os.path.join(COMPRESSED_DIR, asset.hashed_path + suffix)
+            if not os.path.exists(compressed):
+                continue
+            with open(compressed, "rb") as f:
+                body = asset.compressed[encoding] = f.read()
+        return encoding, body
+    return None, asset.body
+
+
+def serve_asset(path):
+    load()
+    asset = _by_hashed.get(path)
+    if asset is None:
+        flask.abort(404)
+    headers = {
+        "Cache-Control": f"public, max-age={MAX_AGE}, immutable",
+        "ETag": f'"{asset.etag}"',
+        "Vary": "Accept-Encoding",
+    }
+    encoding, body = compressed_body(asset, flask.request.accept_encodings)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+        # another representation of the same file, like the compressed answers of compression.py
+        headers["ETag"] = f'W/"{asset.etag}"'
+    if flask.request.if_none_match.contains_weak(asset.etag):
+        return flask.Response(status=304, headers=headers)
+    return flask.Response(body, mimetype=asset.mimetype, headers=headers)
+
+
+def init_app(server):
+    load()
+    server.add_url_rule(URL_PREFIX + "<path:path>", "fingerprinted_asset", serve_asset)
@@ -0,0 +1,140 @@
+# the parts of a page visit that are the same for every visitor, serialized once at startup
+# instead of on every visit:
+# - /_dash-layout (the app shell) and /_dash-dependencies (every callback), served with an
+#   ETag so browsers get a 304 and a CDN in front of the app can keep a copy
+# - the page router's answer (the page layout sent when the address changes) for every page
+#   whose layout is not a function, i.e. all four pages of this site
+# all of it only changes with a deploy. STATIC_PAGES=0 turns it off
+# the copies are made on the first request and not at import: encoding the layouts loads
+# plotly's json encoder and numpy, which would slow down every start (startup_report.py)
+import hashlib
+import os
+import threading
+
+import dash
+import flask
+
+ENABLED = os.environ.get("STATIC_PAGES", "1") == "1"
+# browsers revalidate every time (a cheap 304), a CDN may serve its copy for CDN_MAX_AGE
+# seconds, short enough that a deploy's new callbacks reach everybody quickly
+CDN_MAX_AGE = int(os.environ.get("LAYOUT_CDN_MAX_AGE", 300))
+CACHE_CONTROL = f"public, max-age=0, s-maxage={CDN_MAX_AGE}, must-revalidate"
+CALLBACK_PATH = "/_dash-update-component"
+ROUTER_OUTPUT = ".._pages_content.children..._pages_store.data.."
+
+
+class Frozen:
+    def __init__(self, body, mimetype):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+
+    def response(self, cache_control=None):
+        headers = {"ETag": f'"{self.etag}"'}
+        if cache_control:
+            headers["Cache-Control"] = cache_control
+        # weak comparison, compression.py marks the etag of a compressed copy weak
+        if flask.request.if_none_match.contains_weak(self.etag):
+            return flask.Response(status=304, headers=headers)
+        return flask.Response(self.body, mimetype=self.mimetype, headers=headers)
+
+
+# what the browser sends when the address changes to path (dash.page_container's callback)
+def router_request(path):
+    return {
+        "output": ROUTER_OUTPUT,
+        "outputs": [
+            {"id": "_pages_content", "property": "children"},
+            {"id": "_pages_store", "property": "data"},
+        ],
+        "inputs": [
+            {"id": "_pages_location", "property": "pathname", "value": path},
+            {"id": "_pages_location", "property": "search", "value": ""},
+        ],
+        "changedPropIds": ["_pages_location.pathname"],
+        "state": [],
+    }
+
+
+class StaticPages:
+    def __init__(self, app):
+        self.app = app
+        self.views = {} # route -> Frozen, for the GET routes
+        self.pages = {} # pathname -> Frozen router answer
+        self.prefix = app.config.routes_pathname_prefix
+        self.frozen = False
+        self._freezing = False
+        self._lock = threading.RLock() # the freeze's own requests come back through ensure_frozen
+        os.register_at_fork(after_in_child=self.after_fork)
+
+    def after_fork(self):
+        self._lock = threading.RLock()
+
+    # serializes everything once, through dash's own views so the bytes are exactly
+    # what dash would have sent
+    def freeze(self):
+        client = self.app.server.test_client()
+        for name in ("_dash-layout", "_dash-dependencies"):
+            r = client.get(self.prefix + name)
+            if r.status_code == 200:
+                self.views[self.prefix + name] = Frozen(r.get_data(), r.mimetype)
+        for page in dash.page_registry.values():
+            if callable(page["layout"]):
+                continue # built per visit, nothing to freeze
+            path = page["relative_path"]
+            r = client.post(self.prefix + CALLBACK_PATH.lstrip("/"), json=router_request(path))
+            if r.status_code == 200:
+                self.pages[path] = Frozen(r.get_data(), r.mimetype)
+
+    # before_request: freezes on the first request, the others wait for it
+    def ensure_frozen(self):
+        if self.frozen:
+            return None
+        with self._lock:
+            if not self.frozen and not self._freezing:
+                self._freezing = True
+                try:
+                    self.freeze()
+                finally:
+                    self._freezing = False
+                    self.frozen = True
+        return None
+
+    def serve_view(self, route, original):
+        def view(*args, **kwargs):
+            frozen = self.views.get(route)
+            if frozen is None:
+                return original(*args, **kwargs)
+            return frozen.response(CACHE_CONTROL)
+        return view
+
+    # before_request: answers the page router from the frozen copies
+    def serve_page(self):
+        request = flask.request
+        if request.method != "POST" or not request.path.endswith(CALLBACK_PATH) or not self.pages:
+            return None
+        body = request.get_json(silent=True) or {}
+        if body.get("output") != ROUTER_OUTPUT:
+            return None
+        pathname = next((i.get("value") for i in body.get("inputs", []) if i.get("property") == "pathname"), None)
+        frozen = self.pages.get(pathname)
+        return frozen.response() if frozen is not None else None
+
+    def status(self):
+        return {
+            "views": {route: f.etag for route, f in self.views.items()},
+            "pages": {path: f.etag for path, f in self.pages.items()},
+        }
+
+
+def init_app(app):
+    static = StaticPages(app)
+    if not ENABLED:
+        return static
+    server = app.server
+    for name in ("_dash-layout", "_dash-dependencies"):
+        route = static.prefix + name
+        server.view_functions[route] = static.serve_view(route, server.view_functions[route])
+    server.before_request(static.ensure_frozen) # first, so serve_page finds the copies
+    server.before_request(static.serve_page)
+    return static
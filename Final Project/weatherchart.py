@@ -0,0 +1,72 @@
+# the hourly temperature chart of the weather page
+# the styling never changes, so it lives in one plotly template that is built once;
+# a figure is then only the forecast's times and temperatures plus that template.
+# the figure json is cached per forecast version, every callback for a forecast that
+# was already drawn sends the same string again without building or serializing anything
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from lrucache import LRUCache
+from metrics import timed, watch_cache
+
+FONT_FAMILY = "'Segoe UI', Tahoma, Geneva, Verdana, sans-serif"
+CHART_CACHE_SIZE = 8  # forecast versions kept (one per refresh, and the empty chart)
+
+
+def axis_style(title):
+    return dict(
+        title=dict(text=title, font=dict(size=14, color="#495057")),
+        tickfont=dict(size=12, color="#6c757d"),
+        gridcolor='rgba(0,0,0,0.1)',
+        zeroline=False
+    )
+
+
+# the default plotly look plus the site's colours, fonts and line style
+def build_template():
+    template = go.layout.Template(pio.templates["plotly"])
+    template.layout.update(
+        margin=dict(l=20, r=20, t=20, b=20),
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font=dict(family=FONT_FAMILY, size=12),
+        yaxis=axis_style("Temperature (°F)"),
+        xaxis=axis_style("Time"),
+        hoverlabel=dict(bgcolor="white", font_size=12, font_family=FONT_FAMILY),
+    )
+    template.data.scatter = [go.Scatter(
+        mode="lines+markers",
+        line=dict(color='#8B4513', width=3),
+        marker=dict(color='#A0522D', size=6, line=dict(color='white', width=2)),
+        hovertemplate='<b>%{x}</b><br>Temperature: %{y:.1f}°F<extra></extra>'
+    )]
+    return template
+
+
+TEMPERATURE_TEMPLATE = build_template()
+chart_cache = LRUCache(CHART_CACHE_SIZE)
+watch_cache("weather_chart", chart_cache)
+
+
+def temperature_figure(fc):
+    return go.Figure(go.Scatter(x=fc.times, y=fc.temp_f), layout=dict(template=TEMPERATURE_TEMPLATE))
+
+
+def empty_figure():
+    return go.Figure(layout=dict(
+        title="No weather data available",
+        xaxis_title="Time",
+        yaxis_title="Temperature (°F)"
+    ))
+
+
+# serialized figure for a forecast (None or an empty forecast gives the "no data" chart)
+def figure_json(fc):
+    key = fc.version if fc is not None and not fc.is_empty else "empty"
+    body = chart_cache.get(key)
+    if body is None:
+        with timed("build_weather_chart"):
+            fig = empty_figure() if key == "empty" else temperature_figure(fc)
+            body = fig.to_json()
+        chart_cache.put(key, body)
+    return body